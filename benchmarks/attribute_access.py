@@ -0,0 +1,76 @@
+"""Microbenchmark of attribute reads on Star, Fleet, Player, Tech and Galaxy objects.
+
+"dynamic" temporarily removes the descriptors generated by helpers.data_fields() and the per-snapshot cache
+of each object's data, so that every read goes through _HasData.__getattr__ and looks up the object's data
+again, as all reads did before data_fields(). "descriptors" uses the classes as they are.
+
+Run from the repository root with:
+	PYTHONPATH=. python benchmarks/attribute_access.py
+"""
+
+import timeit
+from contextlib import contextmanager
+
+from folly import galaxy as galaxy_module
+from folly.galaxy import Galaxy, Star, Fleet, Player, Tech
+from folly.helpers import DataField, AliasField
+
+from fakegalaxy import make_data
+
+
+READS = ['star.ships', 'star.name', 'star.puid', 'star.x', 'fleet.ships', 'fleet.owner',
+         'player.economy', 'player.name', 'tech.level', 'tech.current', 'galaxy.tick']
+NUMBER = 2000
+
+
+@contextmanager
+def dynamic_reads():
+	"""Remove the data_fields() descriptors and the data cache for the duration of the block"""
+	removed = []
+	for cls in (Galaxy, Star, Fleet, Player, Tech):
+		for name, value in cls.__dict__.items():
+			if isinstance(value, (DataField, AliasField)):
+				removed.append((cls, name, value))
+				delattr(cls, name)
+	cached_data = galaxy_module._HasGalaxy.data
+	galaxy_module._HasGalaxy.data = property(lambda self: self._find_data(self.galaxy.data))
+	try:
+		yield
+	finally:
+		galaxy_module._HasGalaxy.data = cached_data
+		for cls, name, value in removed:
+			setattr(cls, name, value)
+
+
+def time_reads(objects):
+	"""Returns {read: best time for one read, in microseconds}"""
+	times = {}
+	for stmt in READS:
+		# a function that does just the read, with the objects as its globals
+		namespace = dict(objects)
+		exec "def read():\n\treturn {}".format(stmt) in namespace
+		times[stmt] = min(timeit.repeat(namespace['read'], number=NUMBER, repeat=5)) / NUMBER * 1e6
+	return times
+
+
+def main():
+	galaxy = Galaxy(from_data=make_data(num_stars=500, num_players=8, num_fleets=300))
+	objects = {
+		'galaxy': galaxy,
+		'star': galaxy.stars[10],
+		'fleet': galaxy.fleets[sorted(galaxy.fleets)[3]],
+		'player': galaxy.players[2],
+		'tech': galaxy.player.tech['weapons'],
+	}
+	expected = {stmt: eval(stmt, objects) for stmt in READS}
+	with dynamic_reads():
+		assert {stmt: eval(stmt, objects) for stmt in READS} == expected
+		dynamic = time_reads(objects)
+	descriptors = time_reads(objects)
+	print "{:16} {:>10} {:>12}".format('read', 'dynamic', 'descriptors')
+	for stmt in READS:
+		print "{:16} {:>8.2f}us {:>10.2f}us".format(stmt, dynamic[stmt], descriptors[stmt])
+
+
+if __name__ == '__main__':
+	main()
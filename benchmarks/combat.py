@@ -0,0 +1,37 @@
+"""Benchmark for combat.combat(), against the original round-by-round loop (see tests/test_combat.py).
+
+Run from the repository root with:
+	PYTHONPATH=. python benchmarks/combat.py
+"""
+
+import timeit
+
+from folly.combat import combat
+from tests.test_combat import reference_combat
+
+
+# (description, [(weapons, force list)])
+FIGHTS = [
+	('5000 vs 5000 ships, weapons 1', [(1, [5000]), (1, [5000])]),
+	('5000 ships in 4 fleets vs 3 players, weapons 1-2', [(1, [2000, 1500, 1000, 500]), (2, [3000, 1000]),
+	                                                      (1, [2500]), (2, [1500, 1000])]),
+	('200 vs 150, weapons 3', [(3, [200]), (3, [150])]),
+]
+
+
+def run(fn, forces):
+	fn(*[(ws, list(force_list)) for ws, force_list in forces])
+
+
+def main():
+	for description, forces in FIGHTS:
+		times = []
+		for fn in (reference_combat, combat):
+			number = 10
+			times.append(min(timeit.repeat(lambda: run(fn, forces), number=number, repeat=3)) / number)
+		print "{:50} reference {:9.1f}us  combat {:7.1f}us  ({:.0f}x)".format(
+		      description, times[0] * 1e6, times[1] * 1e6, times[0] / times[1])
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,101 @@
+"""Benchmark for decoding a full_universe_report and building its GalaxyFrame.
+
+It compares eager decoding (the default), lazy decoding (decode_json(lazy=True)), and GalaxyFrame.from_json().
+"partial read" times decoding plus what the techeta script reads (the calling player's tech ETAs),
+and "frame" times decoding plus building the frame.
+
+Give it the path to a recorded report, either the raw response from the server or just its "report" object
+(eg. one of the files npwatcher used to save). Without one, it generates a large random report
+(20000 stars, 20000 fleets, 32 players). Peak memory is the growth in max RSS from decoding it once,
+measured in a child process so that earlier allocations don't hide it.
+Requires numpy, for the frame.
+
+Run from the repository root with:
+	PYTHONPATH=. python benchmarks/decode.py [REPORT_FILE]
+"""
+
+import os
+import sys
+import time
+import resource
+
+import simplejson as json
+
+from folly.galaxy import Galaxy
+from folly.frame import GalaxyFrame
+from folly.request import decode_json
+
+from fakegalaxy import make_report
+
+
+RUNS = 5
+
+
+def best_time(fn, runs=RUNS):
+	"""Best time of several runs of fn, in seconds"""
+	times = []
+	for _ in range(runs):
+		start = time.time()
+		fn()
+		times.append(time.time() - start)
+	return min(times)
+
+
+def in_child(fn):
+	"""Call fn in a forked child process and return its result, which must be a string.
+	This keeps memory fn allocates from affecting later measurements, and vice versa."""
+	read_end, write_end = os.pipe()
+	pid = os.fork()
+	if not pid:
+		os.close(read_end)
+		with os.fdopen(write_end, 'w') as f:
+			f.write(fn())
+		os._exit(0)
+	os.close(write_end)
+	with os.fdopen(read_end) as f:
+		result = f.read()
+	os.waitpid(pid, 0)
+	return result
+
+
+def peak_memory(fn):
+	"""Growth in max RSS, in MB, from calling fn once"""
+	def measure():
+		before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		fn()
+		return str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+	return int(in_child(measure)) / 1024.
+
+
+def main(path=None):
+	if path:
+		with open(path) as f:
+			raw = f.read()
+		description = path
+	else:
+		raw = in_child(lambda: json.dumps(make_report(num_stars=20000, num_players=32, num_fleets=20000)))
+		description = "random report"
+
+	def galaxy(lazy):
+		data = decode_json(raw, lazy=lazy)
+		return Galaxy(from_data=data['report'] if 'report' in data else data)
+
+	def partial_read(lazy):
+		return [tech.eta for tech in galaxy(lazy).player.tech.values()]
+
+	data = galaxy(False).data
+	print "{}: {:.1f}MB, {} stars, {} fleets, {} players".format(
+	      description, len(raw) / 1024.**2, len(data.stars), len(data.fleets), len(data.players))
+	for name, lazy in (('eager', False), ('lazy', True)):
+		print "{:5} decode        {:7.0f}ms  peak +{:.0f}MB".format(
+		      name, best_time(lambda: decode_json(raw, lazy=lazy)) * 1000,
+		      peak_memory(lambda: decode_json(raw, lazy=lazy)))
+		print "{:5} partial read  {:7.0f}ms".format(name, best_time(lambda: partial_read(lazy)) * 1000)
+		print "{:5} frame         {:7.0f}ms".format(
+		      name, best_time(lambda: GalaxyFrame(galaxy(lazy))) * 1000)
+	print "from_json frame     {:7.0f}ms  peak +{:.0f}MB".format(
+	      best_time(lambda: GalaxyFrame.from_json(raw)) * 1000, peak_memory(lambda: GalaxyFrame.from_json(raw)))
+
+
+if __name__ == '__main__':
+	main(*sys.argv[1:])
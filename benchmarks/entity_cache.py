@@ -0,0 +1,61 @@
+"""Benchmark for the per-snapshot cache of Star/Fleet/Player objects on Galaxy.
+
+Accesses galaxy.stars, players, fleets, players_by_name and player repeatedly on a 500-star, 8-player galaxy,
+as a report loop would, and counts how many objects get created and how long it takes.
+"Uncached" discards the galaxy's cache before every access, which is what every access cost before the cache.
+
+Run from the repository root with:
+	PYTHONPATH=. python benchmarks/entity_cache.py
+"""
+
+import time
+
+from folly import galaxy as galaxy_module
+from folly.galaxy import Galaxy
+
+from fakegalaxy import make_data
+
+
+ROUNDS = 200
+
+
+class CountingInit(object):
+	"""Counts calls to _HasGalaxy.__init__, ie. the number of Star/Fleet/Player/Tech objects created"""
+	def __init__(self):
+		self.count = 0
+		self.original = galaxy_module._HasGalaxy.__init__
+	def __enter__(self):
+		original = self.original
+		def counting_init(obj, *args, **kwargs):
+			self.count += 1
+			original(obj, *args, **kwargs)
+		galaxy_module._HasGalaxy.__init__ = counting_init
+		return self
+	def __exit__(self, *exc_info):
+		galaxy_module._HasGalaxy.__init__ = self.original
+
+
+def access(galaxy, discard_cache):
+	for _ in range(ROUNDS):
+		for attr in ('stars', 'players', 'fleets', 'players_by_name', 'player'):
+			if discard_cache:
+				galaxy._cache.clear()
+			getattr(galaxy, attr)
+
+
+def main():
+	galaxy = Galaxy(from_data=make_data(num_stars=500, num_players=8, num_fleets=300))
+	assert galaxy.stars[5] is galaxy.stars[5]
+	print "{} rounds of stars/players/fleets/players_by_name/player on {} stars, {} players, {} fleets".format(
+	      ROUNDS, len(galaxy.stars), len(galaxy.players), len(galaxy.fleets))
+	for label, discard_cache in [('uncached', True), ('cached', False)]:
+		galaxy._cache.clear()
+		with CountingInit() as counter:
+			start = time.time()
+			access(galaxy, discard_cache)
+			elapsed = time.time() - start
+		print "{:10} {:8} objects created  {:8.3f}s".format(label, counter.count, elapsed)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,65 @@
+"""Generates random galaxy data with the same shape as a full_universe_report, for benchmarks.
+Values are random but plausible: stars spread over a 40x40 map, players with every tech,
+fleets orbiting stars with a few waypoints each. The calling player (player 0) can see its research progress.
+"""
+
+import random
+
+import simplejson as json
+
+from folly.request import decode_json
+
+
+TECHS = ['banking', 'manufacturing', 'propulsion', 'research', 'scanning', 'terraforming', 'weapons']
+
+
+def make_report(num_stars=500, num_players=8, num_fleets=300, seed=1, tick=100):
+	"""Returns the report as plain dicts, as the server would send it"""
+	r = random.Random(seed)
+	stars = {}
+	for star_id in range(num_stars):
+		# every player gets at least one star
+		puid = star_id if star_id < num_players else r.choice([-1] + range(num_players))
+		stars[str(star_id)] = {
+			'uid': star_id, 'n': 'Star{}'.format(star_id), 'puid': puid, 'v': '1',
+			'x': '{:.4f}'.format(r.uniform(-20, 20)), 'y': '{:.4f}'.format(r.uniform(-20, 20)),
+			'e': r.randint(0, 20), 'i': r.randint(0, 20), 's': r.randint(0, 5), 'st': r.randint(0, 300),
+			'r': r.randint(5, 50), 'nr': r.randint(5, 50), 'g': 0, 'c': 0.0,
+		}
+	players = {}
+	for player_id in range(num_players):
+		tech = {}
+		for name in TECHS:
+			tech[name] = {'level': r.randint(1, 8), 'value': 1.0}
+			if player_id == 0:
+				tech[name].update(research=r.randint(0, 100), brr=r.choice([144, 192, 240]), sv=0, bv=1)
+		players[str(player_id)] = {
+			'uid': player_id, 'alias': 'Player{}'.format(player_id), 'tech': tech, 'conceded': 0,
+			'total_economy': r.randint(0, 100), 'total_industry': r.randint(1, 100), 'total_science': r.randint(1, 50),
+			'total_stars': r.randint(0, 50), 'total_strength': r.randint(0, 2000), 'total_fleets': r.randint(0, 20),
+		}
+	players['0'].update(researching='weapons', researching_next='banking', cash=100)
+	fleets = {}
+	for fleet_id in range(num_fleets):
+		star = stars[str(r.randrange(num_stars))]
+		fleet = {
+			'uid': fleet_id, 'n': 'Fleet{}'.format(fleet_id), 'puid': r.randrange(num_players), 'st': r.randint(1, 500),
+			'x': star['x'], 'y': star['y'], 'lx': star['x'], 'ly': star['y'], 'w': 0, 'l': 0,
+			'o': [[r.randint(0, 3), r.randrange(num_stars), 0, 0] for _ in range(r.randint(0, 4))],
+		}
+		if r.random() < 0.5:
+			fleet['ouid'] = star['uid']
+		fleets[str(fleet_id)] = fleet
+	return {
+		'admin': 0, 'fleet_speed': 1/24., 'fleets': fleets, 'game_over': 0, 'name': 'benchmark',
+		'now': 1000000 + tick * 3600000, 'paused': False, 'player_uid': 0, 'players': players,
+		'production_counter': tick % 24, 'production_rate': 24, 'productions': tick // 24,
+		'stars': stars, 'stars_for_victory': num_stars * 2 // 5, 'start_time': 0, 'started': True,
+		'tick': tick, 'tick_fragment': 0, 'tick_rate': 60, 'total_stars': num_stars, 'trade_cost': 15,
+		'turn_based': 0, 'war': 0,
+	}
+
+
+def make_data(*args, **kwargs):
+	"""As make_report(), but decoded as folly would decode it from the server, ready for Galaxy(from_data=...)"""
+	return decode_json(json.dumps(make_report(*args, **kwargs)))
@@ -0,0 +1,152 @@
+"""Benchmark for the memory and disk space taken by a game's history of snapshots (see npwatcher's store.py).
+
+It builds a synthetic 3-week game of hourly snapshots from a 500-star fakegalaxy report. Each tick, 25% of stars
+change ships, 30% of fleets move, every player's totals change, and about one tech level changes per day.
+Resident memory is the growth in max RSS from holding every snapshot at once, measured as in decode.py:
+	independent  each snapshot decoded on its own
+	shared       each snapshot decoded, then share()d with the one before, as npwatcher does
+	store        every snapshot read back from a SnapshotStore, which shares unchanged data as it patches
+"changed data" is what share() can't avoid keeping for each snapshot: the size (by sys.getsizeof) of every
+object not shared with the snapshot before, against the same measure of an independent snapshot.
+Its ratio is the most any scheme that holds each snapshot as decoded dicts could save.
+
+Run from the repository root with:
+	PYTHONPATH=.:npwatcher python benchmarks/history_memory.py [SNAPSHOTS]
+"""
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+
+import simplejson as json
+
+from folly.request import decode_json
+from store import SnapshotStore
+from delta import share
+
+from fakegalaxy import make_report
+from decode import in_child, peak_memory
+
+
+SNAPSHOTS = 21 * 24
+
+
+def history(n=SNAPSHOTS, seed=1):
+	"""Yields the JSON of n consecutive hourly snapshots of one game"""
+	r = random.Random(seed)
+	data = make_report()
+	stars, fleets, players = sorted(data['stars']), sorted(data['fleets']), sorted(data['players'])
+	for _ in range(n):
+		data['tick'] += 1
+		data['now'] += 3600000
+		data['tick_fragment'] = r.random()
+		for star_id in r.sample(stars, len(stars) // 4):
+			star = data['stars'][star_id]
+			star['st'] += r.randint(1, 5)
+			star['c'] = r.random()
+		for fleet_id in r.sample(fleets, len(fleets) * 3 // 10):
+			fleet = data['fleets'][fleet_id]
+			fleet['x'] = '{:.4f}'.format(float(fleet['x']) + r.uniform(-.3, .3))
+			fleet['y'] = '{:.4f}'.format(float(fleet['y']) + r.uniform(-.3, .3))
+		for player_id in players:
+			player = data['players'][player_id]
+			player['total_strength'] += r.randint(0, 20)
+			player['total_economy'] += r.randint(0, 1)
+		if r.random() < 1/24.:
+			tech = data['players'][r.choice(players)]['tech']
+			tech[r.choice(sorted(tech))]['level'] += 1
+		yield json.dumps(data)
+
+
+def size(value, old=None):
+	"""Approximate bytes held by value, not counting anything it shares with old
+	(the value in the same place in the snapshot before), nor interned small ints, bools and None."""
+	if value is old or value is None or type(value) is bool or (type(value) is int and -5 <= value <= 256):
+		return 0
+	total = sys.getsizeof(value)
+	if isinstance(value, dict):
+		if not isinstance(old, dict): old = {}
+		total += sum(size(item, dict.get(old, key)) for key, item in dict.iteritems(value))
+	elif isinstance(value, list):
+		total += sum(size(item) for item in value)
+	return total
+
+
+def disk_usage(snapshots, **store_options):
+	"""Bytes on disk for a SnapshotStore holding snapshots, with given class attributes overridden"""
+	directory = tempfile.mkdtemp()
+	try:
+		store = SnapshotStore(directory)
+		store.__dict__.update(store_options)
+		for snapshot in snapshots:
+			store.append(decode_json(snapshot))
+		store.close()
+		return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+	finally:
+		shutil.rmtree(directory)
+
+
+def decode_all(snapshots, shared):
+	kept = []
+	for snapshot in snapshots:
+		data = decode_json(snapshot)
+		if shared and kept:
+			share(kept[-1], data)
+		kept.append(data)
+	return kept
+
+
+def changed_data(snapshots):
+	"""Returns (bytes of all snapshots decoded independently, bytes of what share() leaves unshared)"""
+	independent = unshared = 0
+	previous = None
+	for snapshot in snapshots:
+		data = decode_json(snapshot)
+		independent += size(data)
+		if previous is not None:
+			share(previous, data)
+		unshared += size(data, previous)
+		previous = data
+	return independent, unshared
+
+
+def main(n=SNAPSHOTS):
+	snapshots = list(history(int(n)))
+	print "{} snapshots of {} stars, {} fleets, {} players".format(len(snapshots), *[
+	      len(json.loads(snapshots[0])[key]) for key in ('stars', 'fleets', 'players')])
+
+	raw = sum(len(snapshot) for snapshot in snapshots)
+	keyframes = disk_usage(snapshots, KEYFRAME_INTERVAL=1)
+	default = disk_usage(snapshots)
+	print "on disk:"
+	print "  JSON per snapshot      {:6.1f}MB".format(raw / 1024.**2)
+	print "  store, keyframes only  {:6.1f}MB  ({:.1f}x)".format(keyframes / 1024.**2, raw / float(keyframes))
+	print "  store                  {:6.1f}MB  ({:.1f}x)".format(default / 1024.**2, raw / float(default))
+
+	independent = peak_memory(lambda: decode_all(snapshots, shared=False))
+	shared = peak_memory(lambda: decode_all(snapshots, shared=True))
+	directory = tempfile.mkdtemp()
+	try:
+		store = SnapshotStore(directory)
+		for snapshot in snapshots:
+			store.append(decode_json(snapshot))
+		store = SnapshotStore(directory)
+		from_store = peak_memory(lambda: [store[n] for n in range(len(store))])
+		store.close()
+	finally:
+		shutil.rmtree(directory)
+	print "resident, all snapshots held:"
+	print "  independent            {:6.0f}MB".format(independent)
+	print "  shared                 {:6.0f}MB  ({:.1f}x)".format(shared, independent / shared)
+	print "  store                  {:6.0f}MB  ({:.1f}x)".format(from_store, independent / from_store)
+
+	total, unshared = map(int, in_child(lambda: '{} {}'.format(*changed_data(snapshots))).split())
+	print "changed data:"
+	print "  independent            {:6.0f}MB".format(total / 1024.**2)
+	print "  not shared             {:6.0f}MB  ({:.1f}x)".format(unshared / 1024.**2, total / float(unshared))
+
+
+if __name__ == '__main__':
+	main(*sys.argv[1:])
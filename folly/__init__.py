@@ -1,3 +1,4 @@
 
 from galaxy import Galaxy, Star, Player, Fleet, Tech
 from combat import combat
+from diff import GalaxyDiff
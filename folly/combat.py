@@ -2,6 +2,7 @@ import math
 from collections import defaultdict
 
 from galaxy import Star, Fleet
+from spatial import travel_ticks
 
 def from_objects(*combatants, **kwargs):
 	"""Run a combat between any combination of combatants.
@@ -43,7 +44,7 @@ def from_objects(*combatants, **kwargs):
 	players = sorted(forces.keys(), key=lambda p: (p.player_id - defender.player_id) % len(p.galaxy.players))
 
 	# Run the simulation
-	combat([(p.tech.weapons, force_lists[p]) for p in players])
+	combat(*[(p.tech_level('weapons'), force_lists[p]) for p in players])
 
 	# prepare remaining dict
 	# if not listed, stars had 0 left (but are still present, they don't die like fleets)
@@ -98,6 +99,9 @@ def combat(*forces):
 	i = 0
 	next = lambda x: (x+1) % len(forces)
 	while 1:
+		if i == 0:
+			_skip_rounds(forces)
+
 		damage, force = forces[i]
 
 		while damage:
@@ -115,6 +119,39 @@ def combat(*forces):
 		i = next(i)
 
 
+def _skip_rounds(forces):
+	"""Given forces (damage, force_list) at the start of a round, apply as many whole rounds at once as we can
+	without any force being wiped out.
+	While no force is wiped out, every force simply takes the same damage each round from the force before it,
+	regardless of how ships are split into groups or the order attacks happen in. So we can work out
+	how many rounds every force will survive, and apply that much damage in one go.
+	The round that actually wipes out a force is left to be simulated normally.
+	"""
+	rounds = None
+	for n, (damage, force_list) in enumerate(forces):
+		attacker_damage = forces[n-1][0]
+		if not attacker_damage: continue
+		# the most rounds this force can take while still having at least one ship left
+		survivable = (sum(force_list) - 1) // attacker_damage
+		if rounds is None or survivable < rounds:
+			rounds = survivable
+	if not rounds or rounds < 0: return
+	for n, (damage, force_list) in enumerate(forces):
+		_take_damage(force_list, forces[n-1][0] * rounds)
+
+
+def _take_damage(force_list, damage):
+	"""Remove damage ships from the front of force_list, removing any groups that reach 0.
+	Equivalent to dealing the damage in several smaller parts, as long as some ships are left."""
+	dead = 0
+	while damage and damage >= force_list[dead]:
+		damage -= force_list[dead]
+		dead += 1
+	del force_list[:dead]
+	if damage:
+		force_list[0] -= damage
+
+
 def simple((def_WS, def_n), (att_WS, att_n)):
 	"""A simplified interface for a simpler situation:
 	This is for two-player fights between single collections of ships,
@@ -129,3 +166,111 @@ def simple((def_WS, def_n), (att_WS, att_n)):
 		return True, def_left
 	else:
 		return False, att_left
+
+
+def simple_batch(def_WS, def_n, att_WS, att_n):
+	"""As simple(), but for many fights at once.
+	Takes numpy arrays (or anything numpy can broadcast together, eg. a single WS for all fights)
+	and returns (def_won, remaining) arrays, where def_won is a boolean array.
+	Ship counts and weapons must be integers.
+	"""
+	import numpy
+	def_WS, def_n, att_WS, att_n = numpy.broadcast_arrays(*map(numpy.asarray, (def_WS, def_n, att_WS, att_n)))
+	# -(-a // b) is integer division rounding up
+	att_left = att_n - -(-def_n // att_WS) * (def_WS + 1)
+	def_left = def_n - (-(-att_n // (def_WS + 1)) - 1) * att_WS
+	def_won = def_left > 0
+	return def_won, numpy.where(def_won, def_left, att_left)
+
+
+class OutcomeTable(object):
+	"""Precomputed results of simple() for every combination of ship counts up to max_ships,
+	for when you need to look up many fights between the same weapons levels.
+	The table for each pair of weapons levels is worked out the first time it is needed,
+	so it costs roughly 5 * (max_ships+1)**2 bytes per pair of weapons levels actually used.
+	"""
+
+	def __init__(self, max_ships=1000):
+		self.max_ships = max_ships
+		self.tables = {}
+
+	def table(self, def_WS, att_WS):
+		"""Returns (def_won, remaining) arrays indexed by [def_n, att_n]"""
+		if (def_WS, att_WS) not in self.tables:
+			import numpy
+			ships = numpy.arange(self.max_ships + 1)
+			def_won, remaining = simple_batch(def_WS, ships[:, None], att_WS, ships[None, :])
+			self.tables[def_WS, att_WS] = def_won, remaining.astype(numpy.int32)
+		return self.tables[def_WS, att_WS]
+
+	def lookup(self, (def_WS, def_n), (att_WS, att_n)):
+		"""Same as simple(), but ship counts must be no more than max_ships."""
+		def_won, remaining = self.table(def_WS, att_WS)
+		return bool(def_won[def_n, att_n]), int(remaining[def_n, att_n])
+
+
+def min_attack(def_WS, def_n, att_WS):
+	"""The smallest attacking force that wins against def_n defending ships, as per simple().
+	The attackers will have exactly 1 ship left.
+	Arguments may also be numpy integer arrays, to solve many fights at once.
+	"""
+	# The defender dies after ceil(def_n/att_WS) attacker shots, and gets that many shots (of def_WS+1) first.
+	return -(-def_n // att_WS) * (def_WS + 1) + 1
+
+def min_defence(def_WS, att_WS, att_n):
+	"""The smallest defending force that wins against att_n attacking ships, as per simple().
+	The defenders will have exactly 1 ship left.
+	Arguments may also be numpy integer arrays, to solve many fights at once.
+	"""
+	# The attacker dies after ceil(att_n/(def_WS+1)) defender shots, and gets one less shot than that.
+	return (-(-att_n // (def_WS + 1)) - 1) * att_WS + 1
+
+
+def _defending_ships(star, eta):
+	"""The ships that will defend star in eta ticks, assuming none leave.
+	Includes the owner's orbiting fleets and production, rounded up."""
+	ships = star.ships + sum(fleet.ships for fleet in star.fleets if fleet.data.puid == star.data.puid)
+	return ships + int(math.ceil(eta * star.ship_rate))
+
+def ships_to_capture(star, attacker, eta=0):
+	"""The number of ships attacker needs to send to take star, arriving in eta ticks.
+	Counts ships on the star, fleets orbiting it owned by the star's owner,
+	and (rounding up) ships the star will build before the attack arrives.
+	Star must be visible."""
+	if star.data.puid == -1: return 1
+	return min_attack(star.player.tech_level('weapons'), _defending_ships(star, eta), attacker.tech_level('weapons'))
+
+def ships_to_hold(star, fleet, eta=None):
+	"""The number of extra ships the star's owner needs to have there when fleet arrives in order to hold it.
+	This is in addition to those counted by ships_to_capture (rounding production down, not up).
+	eta defaults to when the fleet will first arrive, and the star must be one of its waypoints in that case.
+	Star must be owned, as an unowned star has nobody to hold it."""
+	if star.data.puid == -1:
+		raise ValueError("{} is unowned, so it can't be held".format(star))
+	if eta is None:
+		eta = dict(zip(fleet.waypoints, fleet.eta)[::-1])[star]
+	ships = _defending_ships(star, 0) + int(eta * star.ship_rate)
+	needed = min_defence(star.player.tech_level('weapons'), fleet.player.tech_level('weapons'), fleet.ships)
+	return max(0, needed - ships)
+
+def capture_costs(attacker, level=None):
+	"""ships_to_capture for every visible enemy star that attacker can reach in a single hop from one of their stars.
+	level defaults to attacker's current range level, and eta is the shortest single hop from attacker's stars.
+	Returns {star: (ships, eta)}. Requires numpy."""
+	import numpy
+	galaxy = attacker.galaxy
+	if level is None: level = attacker.tech_level('propulsion')
+	etas = {}
+	for source in attacker.stars:
+		for dist, star in galaxy.star_grid._reachable(source, level):
+			if star.data.puid == attacker.player_id or not star.visible: continue
+			eta = travel_ticks(dist, galaxy.fleet_speed)
+			if eta < etas.get(star, eta + 1):
+				etas[star] = eta
+	stars = sorted(etas, key=lambda star: star.star_id)
+	if not stars: return {}
+	# unowned stars have no defenders, which min_attack correctly says needs 1 ship
+	def_WS = numpy.array([star.player.tech_level('weapons') if star.data.puid != -1 else 0 for star in stars])
+	def_n = numpy.array([_defending_ships(star, etas[star]) if star.data.puid != -1 else 0 for star in stars])
+	ships = min_attack(def_WS, def_n, attacker.tech_level('weapons'))
+	return {star: (int(n), etas[star]) for star, n in zip(stars, ships)}
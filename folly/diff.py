@@ -0,0 +1,83 @@
+from helpers import snapshot_property
+
+
+class GalaxyDiff(object):
+	"""Describes what changed between two snapshots of the same galaxy.
+	Each part of the diff is only calculated when first asked for, then cached.
+	Normally you would get one via galaxy.diff(oldgalaxy), so it is shared by everything
+	looking at the same pair of snapshots.
+	Stars and fleets are matched by id, players by player index.
+	Pairs are always given as (new, old).
+	"""
+
+	STATS = ('economy', 'industry', 'science', 'ships', 'total_stars', 'total_fleets')
+
+	def __init__(self, galaxy, old):
+		self.galaxy = galaxy
+		self.old = old
+		self._cache = {}
+
+	def __str__(self):
+		return "<GalaxyDiff {self.old.tick} -> {self.galaxy.tick}>".format(self=self)
+	def __repr__(self):
+		return str(self)
+
+	@property
+	def ticks(self):
+		"""Number of ticks between the two snapshots"""
+		return self.galaxy.tick - self.old.tick
+
+	@snapshot_property
+	def players(self):
+		"""List of (player, old_player)"""
+		return zip(self.galaxy.players, self.old.players)
+
+	@snapshot_property
+	def stars(self):
+		"""List of (star, old_star) for all stars present in both"""
+		old_stars = self.old.stars_by_id
+		return [(star, old_stars[star.star_id]) for star in self.galaxy.stars if star.star_id in old_stars]
+
+	@snapshot_property
+	def changed_stars(self):
+		"""List of (star, old_star) for stars whose data differs at all"""
+		return [(star, old_star) for star, old_star in self.stars if star.data != old_star.data]
+
+	@snapshot_property
+	def ownership_changes(self):
+		"""List of (star, old_star) for stars that changed owner"""
+		return [(star, old_star) for star, old_star in self.changed_stars if star.data.puid != old_star.data.puid]
+
+	@snapshot_property
+	def appeared_fleets(self):
+		"""List of fleets that are visible now but were not before (newly built, or newly in scanning range)"""
+		old_fleets = self.old.fleets
+		return [fleet for fleet_id, fleet in sorted(self.galaxy.fleets.items()) if fleet_id not in old_fleets]
+
+	@snapshot_property
+	def vanished_fleets(self):
+		"""List of old fleets that are no longer visible (destroyed, merged or out of scanning range)"""
+		fleets = self.galaxy.fleets
+		return [fleet for fleet_id, fleet in sorted(self.old.fleets.items()) if fleet_id not in fleets]
+
+	@snapshot_property
+	def tech_changes(self):
+		"""List of (player, tech, old_tech) for every tech that changed level"""
+		changes = []
+		for player, old_player in self.players:
+			for tech_name, tech_data in player.data.tech.items():
+				if tech_data.level != old_player.data.tech[tech_name].level:
+					changes.append((player, player.tech[tech_name], old_player.tech[tech_name]))
+		return changes
+
+	@snapshot_property
+	def stat_deltas(self):
+		"""Dict {player: {stat: new value - old value}} for the stats in self.STATS.
+		Only non-zero changes are included."""
+		deltas = {}
+		for player, old_player in self.players:
+			for attr in self.STATS:
+				delta = getattr(player, attr) - getattr(old_player, attr)
+				if delta:
+					deltas.setdefault(player, {})[attr] = delta
+		return deltas
@@ -0,0 +1,136 @@
+"""A columnar view of a galaxy snapshot, for vectorised queries.
+
+A GalaxyFrame holds a Table each for stars, fleets and players. Each Table is a dotdict of equal-length
+numpy arrays (columns), with one row per object in id order. Column names match the names used by the
+object API (eg. 'ships' rather than 'st'), and table.objects() turns rows back into Star/Fleet/Player objects.
+For example, to get all of player 3's stars with more than 100 ships:
+	stars = galaxy.frame.stars
+	galaxy.frame.stars.objects((stars.owner == 3) & (stars.ships > 100))
+Values that aren't visible to the calling player (eg. ships on invisible stars) are 0.
+The frame is a separate view built from the galaxy's data: Star, Fleet and Player objects still read
+their values straight from the data, not from the frame. Reading one value through the frame means
+building it and looking up the row, which costs more than the data lookup it would replace.
+table.row() and table.objects() are the way between the two.
+GalaxyFrame.from_json() builds a frame straight from a report's JSON, without a Galaxy, for callers
+that only need the columns. Such a frame has no objects to give back.
+Requires numpy.
+"""
+
+import numpy
+
+from helpers import dotdict
+from request import fast_loads
+
+
+class Table(dotdict):
+	"""A set of named columns. ids gives the object id for each row, and index maps ids back to rows."""
+
+	def __init__(self, galaxy, ids, lookup, columns):
+		"""lookup should be a function mapping an id to the corresponding object in galaxy,
+		or None if there is no galaxy."""
+		super(Table, self).__init__(columns)
+		self.__dict__['galaxy'] = galaxy
+		self.__dict__['ids'] = numpy.array(ids, dtype=int)
+		self.__dict__['index'] = {obj_id: row for row, obj_id in enumerate(ids)}
+		self.__dict__['lookup'] = lookup
+
+	def __len__(self):
+		return len(self.ids)
+
+	def row(self, obj_id):
+		"""The row number for given id"""
+		return self.index[obj_id]
+
+	def objects(self, rows=None):
+		"""Return objects for the given rows, which may be a boolean mask or a list of row numbers.
+		If rows not given, returns all objects."""
+		if self.lookup is None:
+			raise ValueError("Table has no galaxy to get objects from")
+		ids = self.ids if rows is None else self.ids[rows]
+		return [self.lookup(obj_id) for obj_id in ids.tolist()]
+
+
+def _column(items, key, dtype=float):
+	"""Build a column from key in each of items, with missing values as 0"""
+	return numpy.array([item.get(key, 0) for item in items], dtype=dtype)
+
+
+def _by_id(objects):
+	"""Takes a dict {str(id): data} as found in galaxy data, and returns ([id], [data]) sorted by id.
+	The data dicts are returned as-is, without any lazy wrapping."""
+	items = sorted((int(obj_id), obj) for obj_id, obj in dict.iteritems(objects))
+	return [obj_id for obj_id, obj in items], [obj for obj_id, obj in items]
+
+
+class GalaxyFrame(object):
+
+	STAR_COLUMNS = {
+		'owner': ('puid', int),
+		'economy': ('e', int),
+		'industry': ('i', int),
+		'science': ('s', int),
+		'ships': ('st', int),
+		'garrison': ('g', int),
+		'resources': ('r', int),
+		'natural_resources': ('nr', int),
+		'x': ('x', float),
+		'y': ('y', float),
+	}
+
+	FLEET_COLUMNS = {
+		'owner': ('puid', int),
+		'ships': ('st', int),
+		'x': ('x', float),
+		'y': ('y', float),
+		'lx': ('lx', float),
+		'ly': ('ly', float),
+	}
+
+	PLAYER_COLUMNS = {
+		'economy': ('total_economy', int),
+		'industry': ('total_industry', int),
+		'science': ('total_science', int),
+		'ships': ('total_strength', int),
+		'total_stars': ('total_stars', int),
+		'total_fleets': ('total_fleets', int),
+	}
+
+	def __init__(self, galaxy, data=None):
+		"""Build a frame for galaxy's current data. If data is given, it is used instead, and galaxy may be None."""
+		self.galaxy = galaxy
+		if data is None:
+			data = galaxy.data
+
+		# we read the raw data rather than going through Star and Fleet objects, so that building the frame
+		# doesn't need to create the objects or (with a lazily decoded report) wrap each object's data.
+		star_ids, stars = _by_id(data['stars'])
+		columns = {name: _column(stars, key, dtype) for name, (key, dtype) in self.STAR_COLUMNS.items()}
+		columns['visible'] = numpy.array([star['v'] == '1' for star in stars], dtype=bool)
+		self.stars = Table(galaxy, star_ids, galaxy and (lambda star_id: galaxy.stars_by_id[star_id]), columns)
+
+		fleet_ids, fleets = _by_id(data['fleets'])
+		columns = {name: _column(fleets, key, dtype) for name, (key, dtype) in self.FLEET_COLUMNS.items()}
+		columns['orbiting'] = numpy.array([fleet.get('ouid', -1) for fleet in fleets], dtype=int)
+		columns['orders'] = numpy.array([len(fleet['o']) for fleet in fleets], dtype=int)
+		self.fleets = Table(galaxy, fleet_ids, galaxy and (lambda fleet_id: galaxy.fleets[fleet_id]), columns)
+
+		player_ids, players = _by_id(data['players'])
+		columns = {name: _column(players, key, dtype) for name, (key, dtype) in self.PLAYER_COLUMNS.items()}
+		for tech_name in (players[0]['tech'] if players else ()):
+			columns[tech_name] = numpy.array([player['tech'][tech_name]['level'] for player in players], dtype=int)
+		self.players = Table(galaxy, player_ids, galaxy and (lambda player_id: galaxy.players[player_id]), columns)
+
+	@classmethod
+	def from_json(cls, s):
+		"""Build a frame from the JSON of a full universe report (either the whole response, or just the report),
+		without making a Galaxy. This parses into plain dicts with the fastest available parser, skipping
+		the dotdict wrapping that a Galaxy needs. The frame's galaxy is None, so table.objects() can't be used."""
+		data = fast_loads(s)
+		if 'report' in data:
+			data = data['report']
+		return cls(None, data)
+
+	def __str__(self):
+		return "<GalaxyFrame of {self.galaxy}>".format(self=self)
+	def __repr__(self):
+		return str(self)
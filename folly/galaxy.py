@@ -1,24 +1,52 @@
 import math
 
 from request import order, USE_DEFAULT
-from helpers import dotdict, aliasdict, _HasData
-from helpers import safe_property as property
+from helpers import dotdict, aliasdict, _HasData, data_fields
+from helpers import safe_property as property, snapshot_property
+from spatial import StarGrid, range_level, travel_ticks, distance_matrices
+import routes
+from diff import GalaxyDiff
 
 
+@data_fields('admin', 'fleet_speed', 'fleets', 'game_over', 'name', 'now', 'paused', 'player_uid', 'players',
+             'production_counter', 'production_rate', 'productions', 'stars', 'stars_for_victory', 'start_time',
+             'started', 'starting_bonus', 'tick', 'tick_fragment', 'tick_rate', 'total_stars', 'trade_cost',
+             'turn_based', 'turn_based_time_out', 'war')
 class Galaxy(_HasData):
 
-	def __init__(self, game_number=USE_DEFAULT, cookies=USE_DEFAULT, from_data=None, **request_opts):
-		"""If from_data is given, it uses given data instead of doing an update."""
+	def __init__(self, game_number=USE_DEFAULT, cookies=USE_DEFAULT, from_data=None, client=None, refresh=False,
+	             lazy=False, **request_opts):
+		"""If from_data is given, it uses given data instead of doing an update.
+		client is the request.Client to fetch with. By default, a shared client is used.
+		refresh is passed to update().
+		If lazy=True, reports are decoded lazily (see request.decode_json()), which is faster for callers
+		that only look at a few objects, but slower for those that look at most of them."""
 		self.game_number = game_number
 		self.cookies = cookies
+		self.client = client
+		self.lazy = lazy
 		self.request_opts = request_opts
 		if from_data:
 			self.data = from_data
 		else:
-			self.update()
+			self.update(refresh)
 
-	def update(self):
-		self.data = order('full_universe_report', game_number=self.game_number, cookies=self.cookies, extra_opts=self.request_opts)
+	def update(self, refresh=False):
+		"""Fetch the latest data. Note that if this galaxy's data is already for the current tick, the client may
+		give back the same data without fetching it again. Pass refresh=True to force a fetch."""
+		self.data = order('full_universe_report', client=self.client, game_number=self.game_number, cookies=self.cookies,
+		                  refresh=refresh, lazy=self.lazy, extra_opts=self.request_opts)
+
+	@property
+	def _cache(self):
+		"""A dict for caching values derived from the current data (eg. Star and Player objects).
+		It is tied to the data object it was made for, so replacing self.data (eg. via update())
+		implicitly discards the whole cache at once."""
+		cached_for, cache = self.__dict__.get('_snapshot_cache', (None, None))
+		if cached_for is not self.data:
+			cache = {}
+			self._snapshot_cache = self.data, cache
+		return cache
 
 	def __getattr__(self, attr):
 		try:
@@ -45,12 +73,23 @@ class Galaxy(_HasData):
 	def __ne__(self, other):
 		return not self == other
 
+	def diff(self, old):
+		"""Return a GalaxyDiff describing what changed since old, an earlier snapshot of the same game.
+		The diff is cached, so repeated calls with the same old galaxy share the work."""
+		# We cache it with the old galaxy rather than this one, so that a chain of galaxies each diffed against
+		# the one before doesn't keep every old galaxy alive for as long as the newest one is.
+		key = ('diff', self)
+		if key not in old._cache:
+			old._cache[key] = GalaxyDiff(self, old)
+		return old._cache[key]
+
 	@property
 	def admin(self):
 		return self.players[self.data.admin]
 
-	@property
+	@snapshot_property
 	def fleets(self):
+		"""Note: The returned dict is shared between calls and should not be modified."""
 		# We use a dict {id: object} instead of a list [object] because the "list" is sparse - only visible ones present
 		return {int(fleet_id): Fleet(int(fleet_id), galaxy=self) for fleet_id in self.data.fleets}
 
@@ -69,17 +108,85 @@ class Galaxy(_HasData):
 	def player(self):
 		return self.players[self.data.player_uid]
 
-	@property
+	@snapshot_property
 	def players(self):
+		"""Note: The returned list is shared between calls and should not be modified."""
 		return [Player(int(player_id), galaxy=self) for player_id in sorted(self.data.players, key=int)]
 
-	@property
+	@snapshot_property
 	def players_by_name(self):
 		return {player.name: player for player in self.players}
 
-	@property
+	@snapshot_property
 	def stars(self):
-		return [Star(int(star_id), galaxy=self) for star_id in sorted(self.data.stars, key=int)]
+		"""Note: The returned list is shared between calls and should not be modified."""
+		return [self.stars_by_id[star_id] for star_id in sorted(self.stars_by_id)]
+
+	@snapshot_property
+	def stars_by_id(self):
+		# star ids are not guarenteed to be contiguous, so we can't rely on indexing into stars
+		return {int(star_id): Star(int(star_id), galaxy=self) for star_id in self.data.stars}
+
+	@snapshot_property
+	def _stars_by_owner(self):
+		"""Reverse index {player_id: [star]}. Unowned stars are under -1."""
+		index = {}
+		for star in self.stars:
+			index.setdefault(star.data.puid, []).append(star)
+		return index
+
+	@snapshot_property
+	def _fleets_by_owner(self):
+		"""Reverse index {player_id: [fleet]} over visible fleets."""
+		index = {}
+		for fleet in self.fleets.values():
+			index.setdefault(fleet.data.puid, []).append(fleet)
+		return index
+
+	@snapshot_property
+	def _fleets_by_star(self):
+		"""Reverse index {star_id: [fleet]} over visible fleets currently orbiting a star."""
+		index = {}
+		for fleet in self.fleets.values():
+			if 'ouid' in fleet.data:
+				index.setdefault(fleet.data.ouid, []).append(fleet)
+		return index
+
+	@snapshot_property
+	def star_grid(self):
+		"""A StarGrid spatial index over all stars, for range and neighbourhood queries."""
+		return StarGrid(self.stars)
+
+	@snapshot_property
+	def distance_matrix(self):
+		"""Returns (distances, levels), two numpy arrays giving the distance and the minimum range level
+		between every pair of stars. Rows and columns are in the same order as self.stars.
+		eg. galaxy.distance_matrix[1][i, j] == galaxy.stars[i].distance(galaxy.stars[j], as_level=True)
+		Requires numpy."""
+		return distance_matrices(self.stars)
+
+	@snapshot_property
+	def frame(self):
+		"""A frame.GalaxyFrame holding this snapshot as numpy arrays, for vectorised queries. Requires numpy."""
+		from frame import GalaxyFrame
+		return GalaxyFrame(self)
+
+	@snapshot_property
+	def fleet_etas(self):
+		"""A routes.FleetETAs table of arrival times for every waypoint of every visible fleet.
+		Prefer this to Fleet.eta when looking at many fleets. Requires numpy."""
+		return routes.fleet_etas(self)
+
+	@snapshot_property
+	def tech_etas(self):
+		"""Completion time distributions for every tech of every player whose research progress is known
+		(normally only the calling player). Returns {player_id: {tech_name: eta_details}}"""
+		etas = {}
+		for player in self.players:
+			for tech in player.tech.values():
+				if 'research' not in tech.data: continue
+				etas.setdefault(player.player_id, {})[tech.name] = tech.eta_details
+		return etas
 
 	@property
 	def start_time(self):
@@ -91,7 +198,11 @@ class Galaxy(_HasData):
 
 
 class _HasGalaxy(object):
-	"""A base class for classes that are contained in a galaxy."""
+	"""A base class for classes that are contained in a galaxy.
+	Subclasses should define _find_data(galaxy_data), which returns the object's part of the galaxy's data.
+	"""
+	__slots__ = ('galaxy', '_data_cache')
+
 	def __init__(self, *args, **kwargs):
 		"""A common feature of these classes is that, while they would normally be generated
 		by a galaxy object, they may be created independently. By giving the nessecary game_number
@@ -113,14 +224,26 @@ class _HasGalaxy(object):
 			galaxy = kwargs.pop('galaxy')
 
 		self.galaxy = galaxy
+		self._data_cache = None, None
 
 		super(_HasGalaxy, self).__init__(*args, **kwargs)
 
+	@property
+	def data(self):
+		"""This object's part of the galaxy's data. It is only looked up once per galaxy snapshot."""
+		galaxy_data = self.galaxy.data
+		cached_for, data = self._data_cache
+		if cached_for is not galaxy_data:
+			data = self._find_data(galaxy_data)
+			self._data_cache = galaxy_data, data
+		return data
+
 
 class _HasName(object):
 	"""Base class for game objects that are described / uniquely identified by name.
 	Name is expected to be self.name
 	All this class does is provide a shared str() method."""
+	__slots__ = ()
 
 	def __str__(self):
 		return "<{cls.__name__} {self.name!r}>".format(self=self, cls=type(self))
@@ -128,7 +251,9 @@ class _HasName(object):
 		return str(self)
 
 
+@data_fields('lx', 'ly', 'x', 'y', 'n', 'p', 'puid', 'st', 'uid', 'w', 'ouid', 'l', 'o')
 class Fleet(_HasGalaxy, _HasData, _HasName):
+	__slots__ = ('fleet_id',)
 	aliases = {
 		'owner': 'player',
 		'name': 'n',
@@ -140,14 +265,13 @@ class Fleet(_HasGalaxy, _HasData, _HasName):
 		super(Fleet, self).__init__(**kwargs)
 		self.fleet_id = fleet_id
 
-	@property
-	def data(self):
-		return self.galaxy.data.fleets[str(self.fleet_id)]
+	def _find_data(self, galaxy_data):
+		return galaxy_data.fleets[str(self.fleet_id)]
 
 	@property
 	def waypoints(self):
 		"""Returns bare list of waypoints."""
-		return [Star(star_id, galaxy=self.galaxy) for delay, star_id, order, num_ships in self.data.o]
+		return [self.galaxy.stars_by_id[star_id] for delay, star_id, order, num_ships in self.data.o]
 
 	@property
 	def orders(self):
@@ -158,17 +282,17 @@ class Fleet(_HasGalaxy, _HasData, _HasName):
 		Note that all fleets not owned by galaxy.player have delay 0 and order "Do Nothing"
 		"""
 		ORDER_MAP = ["Do Nothing", "Collect All", "Drop All", "Collect", "Drop", "Collect All But", "Drop All But", "Garrison"]
-		return [(delay, Star(star_id, galaxy=self.galaxy), ORDER_MAP[order], num_ships)
+		return [(delay, self.galaxy.stars_by_id[star_id], ORDER_MAP[order], num_ships)
 		        for delay, star_id, order, num_ships in self.data.o]
 
 	@property
 	def player(self):
-		return Player(self.data.puid, galaxy=self.galaxy)
+		return self.galaxy.players[self.data.puid]
 
 	@property
 	def star(self):
 		if 'ouid' in self.data:
-			return Star(self.data.ouid, galaxy=self.galaxy)
+			return self.galaxy.stars_by_id[self.data.ouid]
 		return None
 
 	@property
@@ -182,7 +306,7 @@ class Fleet(_HasGalaxy, _HasData, _HasName):
 		time = 0
 		position = self
 		for delay, star, order, num_ships in self.orders:
-			time += int(math.ceil(star.distance(position) / self.galaxy.fleet_speed))
+			time += travel_ticks(star.distance(position), self.galaxy.fleet_speed)
 			position = star
 			result.append(time)
 			time += delay
@@ -198,7 +322,9 @@ class Fleet(_HasGalaxy, _HasData, _HasName):
 	def ly(self): return float(self.data.ly)
 
 
+@data_fields('n', 'puid', 'uid', 'v', 'x', 'y', 'c', 'e', 'g', 'ga', 'i', 'nr', 'r', 's', 'st')
 class Star(_HasGalaxy, _HasData, _HasName):
+	__slots__ = ('star_id',)
 	aliases = {
 		'owner': 'player',
 		'name': 'n',
@@ -216,19 +342,23 @@ class Star(_HasGalaxy, _HasData, _HasName):
 		super(Star, self).__init__(**kwargs)
 		self.star_id = star_id
 
-	@property
-	def data(self):
-		return self.galaxy.data.stars[str(self.star_id)]
+	def _find_data(self, galaxy_data):
+		return galaxy_data.stars[str(self.star_id)]
 
 	@property
 	def player(self):
 		puid = self.data.puid
-		return None if puid == -1 else Player(puid, galaxy=self.galaxy)
+		return None if puid == -1 else self.galaxy.players[puid]
 
 	@property
 	def visible(self):
 		return self.data.v == '1'
 
+	@property
+	def ship_rate(self):
+		"""New ships per tick. Only available for visible, owned stars."""
+		return self.industry * (self.player.tech_level('manufacturing') + 5) / 24.0
+
 	@property
 	def x(self): return float(self.data.x)
 	@property
@@ -237,20 +367,34 @@ class Star(_HasGalaxy, _HasData, _HasName):
 	@property
 	def fleets(self):
 		"""Get all orbiting fleets (reverse lookup)"""
-		return [fleet for fleet in self.galaxy.fleets.values() if 'ouid' in fleet.data and fleet.ouid == self.star_id]
+		return list(self.galaxy._fleets_by_star.get(self.star_id, []))
 
 	def distance(self, other, as_level=False):
 		"""Return distance to other star.
 		If as_level=True, convert the result into the minimum range level required.
 		"""
-		dist = math.sqrt((self.x - other.x)**2 + (self.y - other.y)**2)
+		# note we use dx*dx instead of dx**2 as pow() can differ in the last bit, and we want results
+		# to exactly match array-based calculations like distance_matrix.
+		dx, dy = self.x - other.x, self.y - other.y
+		dist = math.sqrt(dx*dx + dy*dy)
 		if not as_level: return dist
-		level = math.ceil(dist) - 3
-		if level < 1: level = 1
-		return level
+		return range_level(dist)
+
+	def in_range(self, level=None):
+		"""Return all other stars that can be reached from this star at given range level, nearest first.
+		level defaults to the range tech level of the star's owner, and must be given for unowned stars."""
+		if level is None:
+			if self.player is None:
+				raise ValueError("{} is unowned, so a range level must be given".format(self))
+			level = self.player.tech_level('propulsion')
+		return self.galaxy.star_grid.reachable(self, level)
 
 
+@data_fields('alias', 'avatar', 'ai', 'conceded', 'huid', 'karma_to_give', 'missed_turns', 'ready', 'tech',
+             'total_economy', 'total_fleets', 'total_industry', 'total_science', 'total_stars', 'total_strength',
+             'uid', 'user_id', 'cash', 'researching', 'researching_next', 'war', 'countdown_to_war')
 class Player(_HasGalaxy, _HasData, _HasName):
+	__slots__ = ('player_id',)
 	aliases = {
 		'name': 'alias',
 		'economy': 'total_economy',
@@ -263,13 +407,12 @@ class Player(_HasGalaxy, _HasData, _HasName):
 		super(Player, self).__init__(**kwargs)
 		self.player_id = player_id
 
-	@property
-	def data(self):
-		return self.galaxy.data.players[str(self.player_id)]
+	def _find_data(self, galaxy_data):
+		return galaxy_data.players[str(self.player_id)]
 
 	def __getattr__(self, attr):
 		# Allow tech to be referenced directly from player object
-		if attr in self.tech:
+		if Tech.TECH_NAME_ALIASES.get(attr, attr) in self.data.tech:
 			return self.tech[attr]
 		return super(Player, self).__getattr__(attr)
 
@@ -284,35 +427,55 @@ class Player(_HasGalaxy, _HasData, _HasName):
 
 	@property
 	def tech(self):
-		class TechDict(aliasdict, dotdict):
-			aliases = Tech.TECH_NAME_ALIASES
-		return TechDict({tech_name: Tech(self.player_id, tech_name, galaxy=self.galaxy)
-		                 for tech_name in self.data.tech})
+		"""A dict {tech name: Tech}. Tech aliases (eg. 'range') may also be used to look up items.
+		This is built once per galaxy snapshot, and should not be modified."""
+		key = ('tech', self.player_id)
+		cache = self.galaxy._cache
+		if key not in cache:
+			cache[key] = TechDict({tech_name: Tech(self.player_id, tech_name, galaxy=self.galaxy)
+			                       for tech_name in self.data.tech})
+		return cache[key]
+
+	def tech_level(self, tech_name):
+		"""Shortcut for player.tech[tech_name].level, without creating any objects."""
+		return self.data['tech'][Tech.TECH_NAME_ALIASES.get(tech_name, tech_name)]['level']
 
 	@property
 	def stars(self):
-		return [star for star in self.galaxy.stars if star.data.puid == self.player_id]
+		return list(self.galaxy._stars_by_owner.get(self.player_id, []))
 
 	@property
 	def fleets(self):
 		"""Note: RETURNS VISIBLE FLEETS ONLY"""
-		return [fleet for fleet in self.galaxy.fleets.values() if fleet.data.puid == self.player_id]
+		return list(self.galaxy._fleets_by_owner.get(self.player_id, []))
 
 	@property
 	def researching(self):
-		return Tech(self.player_id, self.data.researching, galaxy=self.galaxy)
+		return self.tech[self.data.researching]
 
 	@property
 	def researching_next(self):
-		return Tech(self.player_id, self.data.researching_next, galaxy=self.galaxy)
+		return self.tech[self.data.researching_next]
+
+	def route(self, source, dest):
+		"""Fastest path from source to dest at this player's current range level.
+		See routes.route()"""
+		return routes.route(source, dest, self.tech_level('propulsion'))
+
+	def etas_from(self, source):
+		"""Shortest travel time from source to every reachable star at this player's current range level.
+		See routes.etas()"""
+		return routes.etas(source, self.tech_level('propulsion'))
 
 	@property
 	def ship_rate(self):
 		"""New ships per tick"""
-		return self.industry * (self.manufacturing.level + 5) / 24.0
+		return self.industry * (self.tech_level('manufacturing') + 5) / 24.0
 
 
-class Tech(_HasData, _HasGalaxy, _HasName):
+@data_fields('level', 'value', 'sv', 'research', 'bv', 'brr')
+class Tech(_HasGalaxy, _HasData, _HasName):
+	__slots__ = ('player_id', 'name')
 	aliases = {
 		'current': 'research',
 	}
@@ -330,13 +493,12 @@ class Tech(_HasData, _HasGalaxy, _HasName):
 		self.player_id = player_id
 		self.name = tech_name
 
-	@property
-	def data(self):
-		return self.galaxy.data.players[str(self.player_id)].tech[self.name]
+	def _find_data(self, galaxy_data):
+		return galaxy_data.players[str(self.player_id)].tech[self.name]
 
 	@property
 	def player(self):
-		return Player(self.player_id, galaxy=self.galaxy)
+		return self.galaxy.players[self.player_id]
 
 	@property
 	def basecost(self):
@@ -344,7 +506,7 @@ class Tech(_HasData, _HasGalaxy, _HasName):
 			return self.brr
 		except AttributeError:
 			# brr is only available for calling player's tech, but is the same across all tech of same type
-			return Tech(self.galaxy.player_uid, self.tech_name, galaxy=self.galaxy).basecost
+			return self.galaxy.player.tech[self.name].basecost
 
 	@property
 	def required(self):
@@ -376,24 +538,44 @@ class Tech(_HasData, _HasGalaxy, _HasName):
 	def eta_details(self):
 		"""Ticks to completion, based on current player science and experimentation level.
 		Returns a dict {ticks: chance}, ie. mapping from potential completion time in ticks
-		to the probability that it will complete at that time."""
-		# Experimentation gives you 72pts to a random science every production
-		# Stupid brute force implementation for now
-		required = self.required
-		rate = self.player.science
-		def combine(base, add, add_time, chance):
-			# add given add into base with +add_time tick and modified by chance
-			for time, p in add.items():
-				time += add_time
-				p *= chance
-				base[time] = base.get(time, 0) + p
-		def _eta_details(value, time_to_prod=self.galaxy.production_rate):
+		to the probability that it will complete at that time.
+		Results are cached for the current galaxy snapshot."""
+		key = ('tech eta', self.player_id, self.name)
+		cache = self.galaxy._cache
+		if key not in cache:
+			cache[key] = eta_distribution(self.current, self.required, self.player.science,
+			                              self.galaxy.production_rate - self.galaxy.production_counter,
+			                              self.galaxy.production_rate)
+		return dict(cache[key])
+
+
+class TechDict(aliasdict, dotdict):
+	aliases = Tech.TECH_NAME_ALIASES
+
+
+def eta_distribution(current, required, rate, time_to_prod, production_rate):
+	"""Calculate the distribution of ticks until a tech with given current and required research points completes,
+	given a research rate in points per tick, the ticks until the next production and ticks per production.
+	Returns a dict {ticks: chance}. See Tech.eta_details.
+	"""
+	# Experimentation gives you 72pts to a random science every production.
+	# After n productions, the research value depends only on how many of those gave the bonus,
+	# so we track the chance of being at each possible value instead of each possible history.
+	# This makes the cost quadratic in the number of productions, not exponential.
+	result = {}
+	states = {current: 1} # {research value: chance of reaching this production with that value}
+	elapsed = 0
+	while states:
+		next_states = {}
+		for value, p in states.items():
 			naive_eta = max(0, int(math.ceil((required - value)/rate)))
-			if naive_eta <= time_to_prod: return {naive_eta: 1}
-			base = {}
-			without_extra = _eta_details(value + rate*time_to_prod)
-			with_extra = _eta_details(value + rate*time_to_prod + 72)
-			combine(base, without_extra, time_to_prod, 6/7.)
-			combine(base, with_extra, time_to_prod, 1/7.)
-			return base
-		return _eta_details(self.current, self.galaxy.production_rate - self.galaxy.production_counter)
+			if naive_eta <= time_to_prod:
+				result[elapsed + naive_eta] = result.get(elapsed + naive_eta, 0) + p
+				continue
+			value += rate*time_to_prod
+			next_states[value] = next_states.get(value, 0) + p * (6/7.)
+			next_states[value + 72] = next_states.get(value + 72, 0) + p * (1/7.)
+		elapsed += time_to_prod
+		time_to_prod = production_rate
+		states = next_states
+	return result
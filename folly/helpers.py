@@ -15,6 +15,46 @@ class dotdict(dict):
 		raise AttributeError
 	def __hasattr__(self, attr):
 		return attr in self
+	def raw(self, key):
+		"""Return self[key]. See lazydotdict.raw()"""
+		return self[key]
+
+
+class lazydotdict(dotdict):
+	"""A dotdict that holds plain dicts and lists (eg. fresh from a JSON parser),
+	and only converts nested dicts into lazydotdicts when they are first accessed.
+	This avoids building wrapper objects for parts of a large document that are never looked at.
+	"""
+	@staticmethod
+	def _wrap(value):
+		if type(value) is dict:
+			return lazydotdict(value)
+		if type(value) is list and any(type(item) is dict for item in value):
+			return [lazydotdict(item) if type(item) is dict else item for item in value]
+		return value
+
+	def raw(self, key):
+		"""Return self[key] without wrapping it, for code that only needs to read plain values out of it."""
+		return dict.__getitem__(self, key)
+
+	def __getitem__(self, key):
+		value = dict.__getitem__(self, key)
+		wrapped = self._wrap(value)
+		if wrapped is not value:
+			dict.__setitem__(self, key, wrapped)
+		return wrapped
+	def get(self, key, default=None):
+		return self[key] if key in self else default
+	def itervalues(self):
+		for key in self: yield self[key]
+	def iteritems(self):
+		for key in self: yield key, self[key]
+	def values(self):
+		return list(self.itervalues())
+	def items(self):
+		return list(self.iteritems())
+	def pop(self, key, *default):
+		return self._wrap(dict.pop(self, key, *default))
 
 
 class aliasdict(dict):
@@ -41,6 +81,7 @@ class _HasData(object):
 	self.aliases should have form: {'key': 'key_to_use_instead'}
 	For example, to make self.name return self.n, you would set self.aliases = {'name': 'n'}
 	"""
+	__slots__ = ()
 	data = {}
 	aliases = {}
 
@@ -63,6 +104,56 @@ class _HasData(object):
 		return not self == other
 
 
+class DataField(object):
+	"""A descriptor that reads key from self.data, for use by data_fields().
+	A missing key raises AttributeError, so _HasData.__getattr__ is still consulted as a fallback."""
+	__slots__ = ('key',)
+
+	def __init__(self, key):
+		self.key = key
+
+	def __get__(self, instance, owner):
+		if instance is None: return self
+		try:
+			return instance.data[self.key]
+		except KeyError:
+			raise AttributeError(self.key)
+
+
+class AliasField(object):
+	"""A descriptor that reads another attribute, for aliases of properties (see data_fields())."""
+	__slots__ = ('attr',)
+
+	def __init__(self, attr):
+		self.attr = attr
+
+	def __get__(self, instance, owner):
+		if instance is None: return self
+		return getattr(instance, self.attr)
+
+
+def data_fields(*keys):
+	"""Class decorator for _HasData subclasses. Given the known keys of the class's data,
+	generates a descriptor for each key and each entry in cls.aliases, so that they can be accessed
+	directly instead of via _HasData.__getattr__. Names already defined by the class are left alone.
+	Unknown keys still work as before, via __getattr__.
+	"""
+	def _data_fields(cls):
+		def defined(name):
+			return any(name in base.__dict__ for base in cls.__mro__ if base not in (object, _HasData))
+		for key in keys:
+			if not defined(key):
+				setattr(cls, key, DataField(key))
+		for alias, target in cls.aliases.items():
+			if defined(alias): continue
+			if isinstance(cls.__dict__.get(target), DataField):
+				setattr(cls, alias, DataField(target))
+			else:
+				setattr(cls, alias, AliasField(target))
+		return cls
+	return _data_fields
+
+
 class PropertyError(Exception): pass
 def safe_property(fn):
 	"""Acts like @property, but patches a subtle problem: If the property code raises AttributeError for any reason,
@@ -77,3 +168,18 @@ def safe_property(fn):
 			traceback.print_exc()
 			raise PropertyError(str(ex))
 	return property(wrapper)
+
+
+def snapshot_property(fn):
+	"""Acts like safe_property, but the result is computed at most once per galaxy snapshot.
+	Results are stored in self._cache, which is expected to be a dict that is discarded
+	whenever the underlying data changes (see Galaxy._cache).
+	"""
+	name = fn.__name__
+	@functools.wraps(fn)
+	def wrapper(self):
+		cache = self._cache
+		if name not in cache:
+			cache[name] = fn(self)
+		return cache[name]
+	return safe_property(wrapper)
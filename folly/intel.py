@@ -0,0 +1,50 @@
+"""The intel_data request, which gives the main stats of every player for every tick of the game so far.
+This is much cheaper than fetching a full universe report, if the stats are all you want."""
+
+from collections import namedtuple
+
+from request import request, USE_DEFAULT, RequestError
+
+
+PlayerIntel = namedtuple('PlayerIntel', ['player_id', 'economy', 'industry', 'science', 'ships', 'stars', 'fleets',
+                                         'banking', 'manufacturing', 'propulsion', 'research', 'scanning',
+                                         'terraforming', 'weapons'])
+
+# key in the intel data for each field of PlayerIntel
+INTEL_KEYS = {
+	'player_id': 'uid',
+	'economy': 'e',
+	'industry': 'i',
+	'science': 's',
+	'ships': 'sh',
+	'stars': 'ts',
+	'fleets': 'fl',
+	'banking': 'bt',
+	'manufacturing': 'mt',
+	'propulsion': 'ht',
+	'research': 'gt',
+	'scanning': 'st',
+	'terraforming': 'tt',
+	'weapons': 'wt',
+}
+
+
+class IntelPoint(namedtuple('IntelPoint', ['tick', 'players'])):
+	"""The stats at a single tick. players is a list of PlayerIntel, in player order."""
+	__slots__ = ()
+
+	@classmethod
+	def from_data(cls, data):
+		keys = [INTEL_KEYS[field] for field in PlayerIntel._fields]
+		players = [PlayerIntel(*[player[key] for key in keys]) for player in data['players']]
+		return cls(data['tick'], players)
+
+
+def intel_data(game_number=USE_DEFAULT, cookies=USE_DEFAULT, client=None, **request_opts):
+	"""Fetch the intel data for a game. Returns an iterator of IntelPoint, oldest first.
+	Each point is only converted as it is iterated over.
+	Raises RequestError if the server gives back something other than intel data (eg. an error message)."""
+	report = request('intel_data', client=client, game_number=game_number, cookies=cookies, extra_opts=request_opts)
+	if not isinstance(report, dict) or 'stats' not in report:
+		raise RequestError(report)
+	return (IntelPoint.from_data(data) for data in reversed(report['stats']))
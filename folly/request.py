@@ -1,13 +1,27 @@
 import os
+import time
+from collections import deque
+from cookielib import DefaultCookiePolicy
 from posixpath import join as urljoin
 
 import requests
+import requests.adapters
 try:
 	from simplejson import loads
 except ImportError:
 	from json import loads
 
-from helpers import dotdict
+# fast_loads is the fastest parser we have that gives plain dicts and lists, for use with lazy decoding.
+# ujson is much faster than simplejson, but gives unicode rather than str strings, which take more memory.
+# Old versions of ujson also lose float precision, so we check before trusting it.
+try:
+	from ujson import loads as fast_loads
+	if fast_loads('0.30000000000000004') != 0.30000000000000004:
+		raise ImportError
+except ImportError:
+	fast_loads = loads
+
+from helpers import dotdict, lazydotdict
 
 BASE_URL = "http://triton.ironhelmet.com/grequest"
 API_VERSION = '7'
@@ -15,42 +29,170 @@ API_VERSION = '7'
 USE_DEFAULT = object() # we use object() to get a unique constant
 DEFAULT_COOKIE_PATH = "~/.npcookie"
 default_cookies = None
+default_client = None
+
+def order(order_name, client=None, **kwargs):
+	"""Do an order request. See request()."""
+	return request('order', client=client, order=order_name, version=API_VERSION, **kwargs)
+
+def request(name, client=None, **kwargs):
+	"""Do a request with given name and form data, using given Client or else a shared default client.
+	See Client.request()."""
+	if client is None:
+		client = get_default_client()
+	return client.request(name, **kwargs)
+
+def get_default_client():
+	"""Returns the shared Client used by request() and order() when none is given."""
+	global default_client
+	if not default_client:
+		default_client = Client()
+	return default_client
+
+def load_default_cookies():
+	"""Returns the cookies from DEFAULT_COOKIE_PATH. They are only read once, unless default_cookies is reset to None."""
+	global default_cookies
+	if not default_cookies:
+		with open(os.path.expanduser(DEFAULT_COOKIE_PATH)) as f:
+			default_cookies = parse_cookies(f.read().strip())
+	return default_cookies
+
+
+class Client(object):
+	"""Does requests over a pooled, keep-alive session, so repeated requests don't pay for a new connection each time.
+	Responses are requested gzipped. A client may be shared by anything (and any number of games and credentials)
+	that wants to share connections.
+	After each request, timing info is available as client.last_timing, a dotdict with keys:
+		name, order: The request name and order (if any)
+		total: Total time for the request, in seconds
+		response: Time until the response headers arrived
+		decode: Time to decode the response
+		size: Size of the decoded response body, in bytes
+		compressed_size: Size of the response body as sent, if known
+	The most recent timings (up to TIMINGS_KEPT) are in client.timings, oldest first.
+
+	Reports for orders in CACHED_ORDERS (ie. full_universe_report) are cached per game and credential
+	until the next tick, when new data could exist (see report_expiry()). Until then, the same report object
+	is returned again, so it should not be modified. Any other request for the same game and credential
+	(eg. giving fleet orders), other than those in READ_ONLY_REQUESTS, discards the cached report,
+	as it may have changed what the report would say.
+	Pass refresh=True to always fetch a new report. Lazily decoded reports (see decode_json()) are cached
+	separately from eagerly decoded ones.
+	"""
+
+	TIMINGS_KEPT = 100
+	CACHED_ORDERS = {'full_universe_report'}
+	READ_ONLY_REQUESTS = {'intel_data'}
+
+	def __init__(self, base_url=BASE_URL, pool_size=10):
+		"""pool_size is the number of connections to keep open to each host."""
+		self.base_url = base_url
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+		self.session.mount('http://', adapter)
+		self.session.mount('https://', adapter)
+		self.session.headers['Accept-Encoding'] = 'gzip'
+		# cookies are given with each request, and the session may be shared between credentials,
+		# so it must not keep any cookies it is sent.
+		self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+		self.timings = deque(maxlen=self.TIMINGS_KEPT)
+		self._parsed_cookies = {} # {cookie string: parsed cookies}
+		self._reports = {} # {(game_number, cookies, order, lazy): (report, expiry time)}
+
+	@property
+	def last_timing(self):
+		return self.timings[-1] if self.timings else None
+
+	def cookies(self, cookies):
+		"""Resolve a cookies argument (USE_DEFAULT, a cookie string, or a dict) to a dict.
+		Cookie strings are only parsed once per client."""
+		if cookies == USE_DEFAULT:
+			return load_default_cookies()
+		if isinstance(cookies, basestring):
+			if cookies not in self._parsed_cookies:
+				self._parsed_cookies[cookies] = parse_cookies(cookies)
+			return self._parsed_cookies[cookies]
+		return cookies
+
+	def order(self, order_name, **kwargs):
+		return self.request('order', order=order_name, version=API_VERSION, **kwargs)
+
+	def request(self, name, cookies=USE_DEFAULT, game_number=USE_DEFAULT, json=True, extra_opts={}, refresh=False, lazy=False, **data):
+		"""Do a request with given name and form data.
+		If refresh=True, don't use a cached report (the new report is still cached).
+		If lazy=True, the response is decoded lazily (see decode_json())."""
+		cookies = self.cookies(cookies)
+
+		if game_number == USE_DEFAULT:
+			game_number = os.environ['NP_GAME_NUMBER']
+
+		credential = game_number, tuple(sorted(cookies.items()))
+		cacheable = json and name == 'order' and data.get('order') in self.CACHED_ORDERS
+		if not cacheable:
+			if name not in self.READ_ONLY_REQUESTS:
+				for key in [key for key in self._reports if key[:2] == credential]:
+					del self._reports[key]
+		elif not refresh and credential + (data['order'], lazy) in self._reports:
+			report, expiry = self._reports[credential + (data['order'], lazy)]
+			if time.time() < expiry:
+				return report
 
-def order(order_name, **kwargs):
-	return request('order', order=order_name, version=API_VERSION, **kwargs)
+		url = urljoin(self.base_url, name)
+		data['type'] = name
+		if game_number: data['game_number'] = game_number
 
-def request(name, cookies=USE_DEFAULT, game_number=USE_DEFAULT, json=True, extra_opts={}, **data):
-	"""Do a request with given name and form data."""
+		timing = dotdict(name=name, order=data.get('order'))
+		start = time.time()
+		resp = self.session.post(url, data=data, cookies=cookies, **extra_opts)
+		timing.response = resp.elapsed.total_seconds()
+		resp.raise_for_status()
+		# JSON is always utf-8, so we decode from bytes rather than having requests guess the encoding of resp.text
+		body = resp.content
+		timing.size = len(body)
+		compressed_size = resp.headers.get('content-length')
+		timing.compressed_size = int(compressed_size) if compressed_size else None
+		decode_start = time.time()
+		if json:
+			resp_obj = decode_json(body, lazy=lazy)
+		else:
+			text = resp.text
+		timing.decode = time.time() - decode_start
+		timing.total = time.time() - start
+		self.timings.append(timing)
 
-	if cookies == USE_DEFAULT:
-		global default_cookies
-		if not default_cookies:
-			with open(os.path.expanduser(DEFAULT_COOKIE_PATH)) as f:
-				default_cookies = parse_cookies(f.read().strip())
-		cookies = default_cookies
-	elif isinstance(cookies, basestring):
-		cookies = parse_cookies(cookies)
+		if not json: return text
+		report = resp_obj.get('report', None)
 
-	if game_number == USE_DEFAULT:
-		game_number = os.environ['NP_GAME_NUMBER']
+		if report == 'must_be_logged_in':
+			raise RequestError(report)
 
-	url = urljoin(BASE_URL, name)
-	data['type'] = name
-	if game_number: data['game_number'] = game_number
+		if cacheable:
+			# the server reports errors (eg. 'game_not_found') as a string in place of the report
+			if not isinstance(report, dict):
+				raise RequestError(report)
+			# we measure from the start of the request, as the report was made some time after that
+			self._reports[credential + (data['order'], lazy)] = report, start + report_expiry(report)
 
-	resp = requests.post(url, data=data, cookies=cookies, **extra_opts)
-	resp.raise_for_status()
-	if not json: return resp.text
-	resp_obj = decode_json(resp.text)
-	report = resp_obj.get('report', None)
+		return report
 
-	if report == 'must_be_logged_in':
-		raise RequestError(report)
 
-	return report
+def report_expiry(report):
+	"""Given a full universe report, returns the number of seconds (from when the report was made) until
+	the game could have changed, ie. until the next tick. Games that aren't running normally could change at
+	any time (eg. by being unpaused, or all players submitting a turn), so for those this is 0."""
+	if not report.get('started') or report.get('paused') or report.get('game_over') or report.get('turn_based'):
+		return 0
+	# tick_fragment is how far through the current tick the game was at the time of the report (report.now),
+	# as a fraction of a tick (see docs/api.txt). tick_rate is minutes per tick.
+	return max(0, (1 - report.tick_fragment) * report.tick_rate * 60)
 
-def decode_json(s):
-	"""This is just a helper method to isolate how we turn a response from JSON into python objects."""
+def decode_json(s, lazy=False):
+	"""This is just a helper method to isolate how we turn a response from JSON into python objects.
+	If lazy=True, s is parsed with the fastest available parser into plain dicts, which are only made into
+	dotdicts when accessed (see lazydotdict). This is quicker to decode when only part of the result will be used,
+	but slower to access every object of."""
+	if lazy:
+		return lazydotdict(fast_loads(s))
 	return loads(s, object_hook=dotdict)
 
 def parse_cookies(s):
@@ -0,0 +1,162 @@
+"""Route planning between stars.
+Stars are connected when the distance between them can be travelled at a given range level,
+and each hop takes a whole number of ticks, as per Fleet.eta.
+"""
+
+import heapq
+
+from spatial import travel_ticks
+
+
+def _neighbours(star, level):
+	"""Returns [(ticks, neighbour)] for all stars reachable from star in one hop.
+	These are cached with the galaxy snapshot, so repeated searches only find each star's neighbours once."""
+	hops = star.galaxy._cache.setdefault(('route hops', level), {})
+	if star not in hops:
+		fleet_speed = star.galaxy.fleet_speed
+		hops[star] = [(travel_ticks(dist, fleet_speed), other)
+		              for dist, other in star.galaxy.star_grid._reachable(star, level)]
+	return hops[star]
+
+
+def _search(source, level, dest=None):
+	"""Run a shortest path search outwards from source.
+	If dest is given, stops once dest is reached, using straight-line travel time to guide the search (A*).
+	Returns ({star: ticks}, {star: previous star on path}) for all stars whose time was finalised."""
+	fleet_speed = source.galaxy.fleet_speed
+	def estimate(star):
+		if dest is None: return 0
+		return travel_ticks(star.distance(dest), fleet_speed)
+
+	etas = {}
+	previous = {source: None}
+	best = {source: 0}
+	queue = [(estimate(source), 0, source.star_id, source)]
+	while queue:
+		_, ticks, _, star = heapq.heappop(queue)
+		if star in etas: continue # already finalised with a better time
+		etas[star] = ticks
+		if star is dest: break
+		for hop, other in _neighbours(star, level):
+			other_ticks = ticks + hop
+			if other in etas or best.get(other, other_ticks + 1) <= other_ticks: continue
+			best[other] = other_ticks
+			previous[other] = star
+			heapq.heappush(queue, (other_ticks + estimate(other), other_ticks, other.star_id, other))
+	return etas, previous
+
+
+def route(source, dest, level):
+	"""Find the fastest path from source star to dest star, with each hop limited to given range level.
+	Returns (path, eta), where path is a list of stars starting with source and ending with dest,
+	and eta is the total travel time in ticks.
+	Returns None if dest cannot be reached."""
+	etas, previous = _search(source, level, dest)
+	if dest not in etas: return None
+	path = [dest]
+	while previous[path[-1]] is not None:
+		path.append(previous[path[-1]])
+	return path[::-1], etas[dest]
+
+
+def etas(source, level):
+	"""As route(), but finds the shortest travel time from source to every star at once.
+	Returns a dict {star: eta} for all reachable stars (including source itself, with eta 0)."""
+	etas, previous = _search(source, level)
+	return etas
+
+
+class FleetETAs(object):
+	"""A table of arrival times for every waypoint of every visible fleet.
+	It has three parallel numpy arrays, fleet_ids, star_ids and etas, with one row per waypoint.
+	Rows are ordered by fleet id, then by order of waypoints, so the etas for a single fleet
+	are the same as Fleet.eta.
+	"""
+
+	def __init__(self, fleet_ids, star_ids, etas):
+		self.fleet_ids = fleet_ids
+		self.star_ids = star_ids
+		self.etas = etas
+		self._index = None
+
+	def __len__(self):
+		return len(self.etas)
+
+	def __iter__(self):
+		"""Yields (fleet_id, star_id, eta) rows"""
+		return iter(zip(self.fleet_ids.tolist(), self.star_ids.tolist(), self.etas.tolist()))
+
+	@property
+	def index(self):
+		"""A dict {(fleet_id, star_id): eta}. If a fleet visits the same star more than once,
+		the earliest arrival is used."""
+		if self._index is None:
+			self._index = {}
+			for fleet_id, star_id, eta in reversed(list(self)):
+				self._index[fleet_id, star_id] = eta
+		return self._index
+
+	def get(self, fleet_id, star_id, default=None):
+		"""Returns ticks until given fleet first reaches given star, or default if it isn't a waypoint."""
+		return self.index.get((fleet_id, star_id), default)
+
+	def __contains__(self, (fleet_id, star_id)):
+		return (fleet_id, star_id) in self.index
+
+	def for_fleet(self, fleet_id):
+		"""Returns list of etas for given fleet, as per Fleet.eta"""
+		# fleet_ids is sorted, so the fleet's rows are contiguous
+		start = self.fleet_ids.searchsorted(fleet_id, side='left')
+		end = self.fleet_ids.searchsorted(fleet_id, side='right')
+		return self.etas[start:end].tolist()
+
+
+def fleet_etas(galaxy):
+	"""Calculate arrival times for every waypoint of every visible fleet in given galaxy at once.
+	Returns a FleetETAs table. Requires numpy."""
+	import numpy
+
+	stars = galaxy.frame.stars
+	star_index = stars.index
+	star_xy = numpy.column_stack((stars.x, stars.y))
+
+	# flatten all orders into parallel lists, noting where each fleet's orders begin
+	fleet_ids, star_ids, delays, firsts, fleet_xy = [], [], [], [], []
+	for fleet_id in sorted(galaxy.fleets):
+		data = galaxy.fleets[fleet_id].data
+		if not data.o: continue
+		firsts.append(len(star_ids))
+		fleet_xy.append((float(data.x), float(data.y)))
+		for delay, star_id, order, num_ships in data.o:
+			fleet_ids.append(fleet_id)
+			star_ids.append(star_id)
+			delays.append(delay)
+
+	fleet_ids = numpy.array(fleet_ids, dtype=int)
+	star_ids = numpy.array(star_ids, dtype=int)
+	if not len(star_ids):
+		return FleetETAs(fleet_ids, star_ids, numpy.zeros(0, dtype=int))
+	delays = numpy.array(delays, dtype=int)
+	firsts = numpy.array(firsts, dtype=int)
+
+	# each leg goes from the previous waypoint (or the fleet's position, for the first) to this waypoint
+	dest = star_xy[[star_index[star_id] for star_id in star_ids]]
+	origin = numpy.roll(dest, 1, axis=0)
+	origin[firsts] = fleet_xy
+	dx = dest[:, 0] - origin[:, 0]
+	dy = dest[:, 1] - origin[:, 1]
+	ticks = numpy.ceil(numpy.sqrt(dx*dx + dy*dy) / galaxy.fleet_speed).astype(int)
+
+	# each leg starts after the previous waypoint's delay
+	previous_delays = numpy.roll(delays, 1)
+	previous_delays[firsts] = 0
+	steps = ticks + previous_delays
+
+	# a running total over all fleets, with each fleet's total before its first leg subtracted
+	totals = numpy.cumsum(steps)
+	starts = numpy.zeros(len(steps), dtype=int)
+	starts[firsts] = 1
+	group = numpy.cumsum(starts) - 1
+	etas = totals - (totals - steps)[firsts][group]
+
+	return FleetETAs(fleet_ids, star_ids, etas)
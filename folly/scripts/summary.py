@@ -1,7 +1,7 @@
 #!/bin/env python
 
 from folly import Galaxy
-galaxy = Galaxy()
+galaxy = Galaxy(lazy=True)
 
 FORMAT = (
 	'{namestr:{width}}  {0.economy}/{0.industry}/{0.science} ships:{0.ships}+{0.ship_rate:.2f}/tick '
@@ -1,7 +1,7 @@
 #!/bin/env python
 
 from folly import Galaxy
-galaxy = Galaxy()
+galaxy = Galaxy(lazy=True)
 
 techs = galaxy.player.tech
 
@@ -4,14 +4,15 @@ import time
 import sys
 
 from folly import Galaxy
-from folly.request import RequestError
+from folly.request import RequestError, Client
 import folly.request
 
+client = Client()
 old_galaxy = None
+forced = False
 while True:
-	galaxy = Galaxy()
 	try:
-		galaxy.update()
+		galaxy = Galaxy(client=client, refresh=forced)
 	except RequestError, ex:
 		print "ERROR: Could not update:", ex
 		folly.request.default_cookies = None # clear cached cookie, it's wrong
@@ -26,48 +27,47 @@ while True:
 				else:
 					print "WARNING: No change in tick. Bad update time or force refresh?"
 
+			diff = galaxy.diff(old_galaxy)
+
 			# star change ownership
-			for star, old_star in zip(galaxy.stars, old_galaxy.stars):
-				if star.puid != old_star.puid:
-					if old_star.puid == -1:
-						print "{0.player.name} colonised {0.name}".format(star, old_star)
-					else:
-						print "{0.player.name} captured {0.name} from {1.player.name}".format(star, old_star)
+			for star, old_star in diff.ownership_changes:
+				if old_star.puid == -1:
+					print "{0.player.name} colonised {0.name}".format(star, old_star)
+				else:
+					print "{0.player.name} captured {0.name} from {1.player.name}".format(star, old_star)
 
 			# players have unexpected ship count (indicates battles)
 			SHIP_CHANGE_THRESHOLD = 4
-			for player, old_player in zip(galaxy.players, old_galaxy.players):
+			for player, old_player in diff.players:
 				missing = int(old_player.ships + old_player.ship_rate) - player.ships
 				if missing > SHIP_CHANGE_THRESHOLD:
 					print "{player.name} missing {missing} ships - possible battle?".format(player=player, missing=missing)
 
 			# tech upgrades
-			for player, old_player in zip(galaxy.players, old_galaxy.players):
-				for tech_name in player.tech:
-					tech = player.tech[tech_name]
-					old_tech = old_player.tech[tech_name]
-					if tech.level != old_tech.level:
-						print "{player.name} upgraded {tech.name} tech {old_tech.level} -> {tech.level}".format(player=player, old_tech=old_tech, tech=tech)
+			for player, tech, old_tech in diff.tech_changes:
+				print "{player.name} upgraded {tech.name} tech {old_tech.level} -> {tech.level}".format(player=player, old_tech=old_tech, tech=tech)
 
 			# core stat changes
-			for player, old_player in zip(galaxy.players, old_galaxy.players):
+			for player, old_player in diff.players:
+				deltas = diff.stat_deltas.get(player, {})
 				for attr in ('economy', 'industry', 'science', 'total_fleets'):
-					oldval = getattr(old_player, attr)
-					newval = getattr(player, attr)
+					delta = deltas.get(attr, 0)
 					attrname = 'fleets' if attr == 'total_fleets' else attr
-					if oldval > newval:
-						print "{player.name} has lost {loss} {attr}".format(player=player, attr=attrname, loss=oldval-newval)
-					elif newval > oldval:
-						print "{player.name} has gained {gain} {attr}".format(player=player, attr=attrname, gain=newval-oldval)
+					if delta < 0:
+						print "{player.name} has lost {loss} {attr}".format(player=player, attr=attrname, loss=-delta)
+					elif delta > 0:
+						print "{player.name} has gained {gain} {attr}".format(player=player, attr=attrname, gain=delta)
 
 		else:
 			print "No previous data."
 
 		old_galaxy = galaxy
 
+	forced = False
 	try:
 		time.sleep(3600)
 	except KeyboardInterrupt:
 		if raw_input("forced refresh. exit? ").startswith('y'):
 			sys.exit(0)
+		forced = True
 	print
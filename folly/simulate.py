@@ -0,0 +1,206 @@
+"""Projecting a galaxy forward in time.
+
+A Simulation copies the state it needs out of a Galaxy into numpy arrays, then advances it one tick at a time:
+	Fleets move along their orders, taking the same number of ticks for each leg as Fleet.eta says.
+	Fleets that arrive somewhere with enemies present fight, as per combat.combat().
+	A fleet that arrives at an unowned star on its own takes it.
+	Stars build ships as per Star.ship_rate.
+	Players with known research progress (normally only the calling player) research their current tech.
+It is a projection, not a perfect prediction. Notably, it does not:
+	Carry out fleet actions (collect, drop, garrison), as these are only known for our own fleets.
+	Predict orders that haven't been given yet, or anything involving cash (upgrades, new fleets).
+	Include random experimentation bonuses.
+Requires numpy.
+"""
+
+import math
+
+import numpy
+
+from combat import combat
+from spatial import travel_ticks
+
+
+class Simulation(object):
+
+	def __init__(self, galaxy):
+		self.galaxy = galaxy
+		self.tick = galaxy.tick
+		self.fleet_speed = galaxy.fleet_speed
+
+		frame = galaxy.frame
+
+		# stars
+		self.star_ids = frame.stars.ids
+		self.star_index = frame.stars.index
+		self.star_xy = numpy.column_stack((frame.stars.x, frame.stars.y))
+		self.star_owner = frame.stars.owner.copy()
+		# invisible stars have unknown ships and industry, we treat them as 0
+		self.star_ships = frame.stars.ships.astype(float)
+		self.star_industry = frame.stars.industry.astype(float)
+
+		# players
+		players = galaxy.players
+		self.tech_names = sorted(players[0].data.tech) if players else []
+		# tech_levels[player_id, n] is the level of tech self.tech_names[n]
+		self.tech_levels = numpy.column_stack([frame.players[name] for name in self.tech_names]).reshape(len(players), -1)
+		self.science = frame.players.science.astype(float)
+		# {player_id: [tech index, research points, points needed per level]} for players with known research
+		self.research = {}
+		for player in players:
+			if 'researching' not in player.data: continue
+			tech = player.researching
+			self.research[player.player_id] = [self.tech_names.index(tech.name), tech.current, tech.basecost]
+
+		# fleets
+		fleets = frame.fleets.objects()
+		self.fleet_ids = frame.fleets.ids
+		self.fleet_owner = frame.fleets.owner
+		self.fleet_ships = frame.fleets.ships.copy()
+		# star index the fleet is orbiting, or -1 if in transit
+		self.fleet_star = numpy.array([self.star_index.get(star_id, -1) for star_id in frame.fleets.orbiting.tolist()], dtype=int)
+		# remaining orders as lists of (delay, star index). The first is the current target.
+		self.fleet_orders = [[(delay, self.star_index[star_id]) for delay, star_id, order, num_ships in fleet.data.o]
+		                     for fleet in fleets]
+		# ticks until arrival at the current target, and how many of those are spent travelling.
+		# A fleet with no target has a countdown of -1.
+		self.fleet_countdown = numpy.full(len(fleets), -1, dtype=int)
+		self.fleet_travel = numpy.zeros(len(fleets), dtype=int)
+		self.fleet_alive = numpy.ones(len(fleets), dtype=bool)
+		for n, fleet in enumerate(fleets):
+			if self.fleet_orders[n]:
+				delay, target = self.fleet_orders[n][0]
+				position = frame.fleets.x[n], frame.fleets.y[n]
+				self.fleet_countdown[n] = self.fleet_travel[n] = self._travel(position, target)
+
+	def _travel(self, (x, y), target):
+		"""Ticks to travel from given position to target star index"""
+		dx, dy = self.star_xy[target, 0] - x, self.star_xy[target, 1] - y
+		return travel_ticks(math.sqrt(dx*dx + dy*dy), self.fleet_speed)
+
+	def run(self, ticks):
+		"""Advance the given number of ticks. Returns self, for convenience."""
+		for _ in range(ticks):
+			self.step()
+		return self
+
+	def step(self):
+		"""Advance one tick"""
+		self.tick += 1
+		arrivals = self._move()
+		for star in sorted(arrivals):
+			self._arrive(star)
+		self._produce()
+		self._research()
+
+	def _move(self):
+		"""Move all fleets by one tick, and return the set of star indexes with new arrivals."""
+		moving = self.fleet_countdown >= 0
+		self.fleet_countdown[moving] -= 1
+		# fleets that have finished their delay at a star have left it
+		departed = moving & (self.fleet_countdown < self.fleet_travel)
+		self.fleet_star[departed] = -1
+
+		arrivals = set()
+		arrived = numpy.flatnonzero(moving & (self.fleet_countdown <= 0))
+		while len(arrived):
+			for n in arrived.tolist():
+				delay, target = self.fleet_orders[n].pop(0)
+				self.fleet_star[n] = target
+				arrivals.add(target)
+				if self.fleet_orders[n]:
+					next_delay, next_target = self.fleet_orders[n][0]
+					self.fleet_travel[n] = self._travel(self.star_xy[target], next_target)
+					self.fleet_countdown[n] = delay + self.fleet_travel[n]
+				else:
+					self.fleet_countdown[n] = -1
+			# legs which take 0 ticks (eg. to the same star) arrive immediately
+			arrived = arrived[self.fleet_countdown[arrived] == 0]
+		return arrivals
+
+	def _arrive(self, star):
+		"""Resolve any combat at given star index, and let fleets take it if unowned"""
+		here = numpy.flatnonzero((self.fleet_star == star) & self.fleet_alive)
+		players = set(self.fleet_owner[here].tolist())
+		if self.star_owner[star] != -1:
+			players.add(self.star_owner[star])
+		if len(players) > 1:
+			self._combat(star, here, players)
+			here = here[self.fleet_alive[here]]
+		# a single player's fleets at an unowned star take it
+		players = set(self.fleet_owner[here].tolist())
+		if self.star_owner[star] == -1 and len(players) == 1:
+			self.star_owner[star] = players.pop()
+
+	def _combat(self, star, here, players):
+		"""Fight between all forces at given star index, with the star's owner (if any) defending.
+		Force lists are made in the same way as combat.from_objects()."""
+		owner = self.star_owner[star]
+		defender = owner if owner != -1 else self.fleet_owner[here[0]]
+		num_players = len(self.weapons)
+		order = sorted(players, key=lambda p: (p - defender) % num_players)
+
+		forces = {}
+		for player in order:
+			fleets = here[self.fleet_owner[here] == player]
+			fleets = fleets[numpy.argsort(-self.fleet_ships[fleets], kind='mergesort')].tolist()
+			combatants = ([None] if player == owner else []) + fleets # None stands for the star
+			forces[player] = combatants, [self._ships(combatant, star) for combatant in combatants]
+
+		combat(*[(self.weapons[player], forces[player][1]) for player in order])
+
+		for player in order:
+			combatants, force_list = forces[player]
+			# survivors are always the last of each force list
+			survivors = dict(zip(combatants[::-1], force_list[::-1]))
+			for combatant in combatants:
+				ships = survivors.get(combatant, 0)
+				if combatant is None:
+					self.star_ships[star] = ships + self.star_ships[star] % 1
+				else:
+					self.fleet_ships[combatant] = ships
+					if not ships:
+						self.fleet_alive[combatant] = False
+						self.fleet_star[combatant] = -1
+						self.fleet_countdown[combatant] = -1
+
+		if owner != -1 and not forces[owner][1]:
+			# star lost
+			self.star_owner[star] = -1
+			self.star_ships[star] = 0
+
+	def _ships(self, combatant, star):
+		if combatant is None:
+			return int(self.star_ships[star])
+		return int(self.fleet_ships[combatant])
+
+	def _produce(self):
+		"""Build ships at every owned star, as per Star.ship_rate"""
+		# only index by owners of owned stars, as an unowned star's -1 would read the last player's row
+		owned = numpy.flatnonzero(self.star_owner >= 0)
+		manufacturing = self.manufacturing[self.star_owner[owned]]
+		self.star_ships[owned] += self.star_industry[owned] * (manufacturing + 5) / 24.0
+
+	def _research(self):
+		for player_id, research in self.research.items():
+			tech, points, basecost = research
+			points += self.science[player_id]
+			required = self.tech_levels[player_id, tech] * basecost
+			if points >= required:
+				points -= required
+				self.tech_levels[player_id, tech] += 1
+			research[1] = points
+
+	def level(self, player_id, tech_name):
+		"""Current simulated tech level for given player"""
+		return self.tech_levels[player_id, self.tech_names.index(tech_name)]
+
+	@property
+	def weapons(self):
+		"""Array of current weapons level by player id"""
+		return self.tech_levels[:, self.tech_names.index('weapons')]
+
+	@property
+	def manufacturing(self):
+		"""Array of current manufacturing level by player id"""
+		return self.tech_levels[:, self.tech_names.index('manufacturing')]
@@ -0,0 +1,152 @@
+import math
+from collections import OrderedDict
+
+
+def range_level(dist):
+	"""Convert a distance into the minimum range (propulsion) level required to travel it."""
+	level = math.ceil(dist) - 3
+	if level < 1: level = 1
+	return level
+
+def level_range(level):
+	"""Inverse of range_level: the maximum distance that can be travelled at given range level."""
+	return level + 3
+
+def travel_ticks(dist, fleet_speed):
+	"""Number of ticks for a fleet to travel given distance in a single hop.
+	Partial ticks are rounded up, as a fleet always arrives on a tick."""
+	return int(math.ceil(dist / fleet_speed))
+
+
+class StarGrid(object):
+	"""A uniform grid over star positions, for answering neighbourhood queries
+	without checking every star.
+	Any query origin may be any object with x and y attributes, eg. a Star or a Fleet.
+	Stars are expected to not move, so a grid may be re-used for as long as the set of stars is the same.
+	"""
+
+	def __init__(self, stars, cell_size=None):
+		"""cell_size defaults to a size that puts roughly two stars in each cell."""
+		self.stars = list(stars)
+		self.positions = [(star.x, star.y) for star in self.stars]
+		if self.positions:
+			xs, ys = zip(*self.positions)
+			self.min_x, self.min_y = min(xs), min(ys)
+			width, height = max(xs) - self.min_x, max(ys) - self.min_y
+		else:
+			self.min_x = self.min_y = width = height = 0
+		if cell_size is None:
+			cell_size = math.sqrt(2.0 * max(width * height, 1) / max(len(self.stars), 1))
+		self.cell_size = float(cell_size)
+		self.cells = {}
+		for n, (x, y) in enumerate(self.positions):
+			self.cells.setdefault(self._cell(x, y), []).append(n)
+
+	def _cell(self, x, y):
+		return int(math.floor((x - self.min_x) / self.cell_size)), int(math.floor((y - self.min_y) / self.cell_size))
+
+	def _box(self, x, y, radius):
+		"""Return all non-empty cells that overlap the square of given radius around (x, y)"""
+		min_cx, min_cy = self._cell(x - radius, y - radius)
+		max_cx, max_cy = self._cell(x + radius, y + radius)
+		if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(self.cells):
+			# cheaper to just check every occupied cell
+			return [(cx, cy) for cx, cy in self.cells if min_cx <= cx <= max_cx and min_cy <= cy <= max_cy]
+		return [(cx, cy) for cx in range(min_cx, max_cx + 1) for cy in range(min_cy, max_cy + 1)]
+
+	def _ring(self, (cx, cy), r):
+		"""Yield all cell indexes at exactly chebyshev distance r from given cell"""
+		if r == 0:
+			yield cx, cy
+			return
+		for dx in range(-r, r+1):
+			yield cx + dx, cy - r
+			yield cx + dx, cy + r
+		for dy in range(-r+1, r):
+			yield cx - r, cy + dy
+			yield cx + r, cy + dy
+
+	def _distances(self, cells, x, y):
+		"""Yield (distance, index) for all stars in given cells"""
+		for cell in cells:
+			for n in self.cells.get(cell, ()):
+				dx, dy = self.positions[n][0] - x, self.positions[n][1] - y
+				yield math.sqrt(dx*dx + dy*dy), n
+
+	def within(self, origin, radius):
+		"""Return all stars within radius of origin, nearest first."""
+		x, y = origin.x, origin.y
+		cells = self._box(x, y, radius)
+		found = sorted((dist, n) for dist, n in self._distances(cells, x, y) if dist <= radius)
+		return [self.stars[n] for dist, n in found]
+
+	def nearest(self, origin, k=1):
+		"""Return the k stars nearest to origin, nearest first.
+		Note that if origin is itself a star, it will be the first result."""
+		x, y = origin.x, origin.y
+		k = min(k, len(self.stars))
+		if not k: return []
+		center = self._cell(x, y)
+		found = []
+		r = 0
+		while True:
+			found.extend(self._distances(self._ring(center, r), x, y))
+			# every star not yet seen is at least r cells away from the origin cell in some axis
+			if len(found) >= k:
+				found.sort()
+				if found[k-1][0] <= r * self.cell_size:
+					break
+			r += 1
+			if len(found) == len(self.stars):
+				found.sort()
+				break
+		return [self.stars[n] for dist, n in found[:k]]
+
+	def reachable(self, origin, level):
+		"""Return all stars (other than origin) that can be travelled to from origin at given range level,
+		nearest first. This agrees with Star.distance(other, as_level=True) <= level."""
+		return [star for dist, star in self._reachable(origin, level)]
+
+	def _reachable(self, origin, level):
+		"""As reachable(), but returns (distance, star) pairs."""
+		x, y = origin.x, origin.y
+		radius = level_range(level)
+		cells = self._box(x, y, radius)
+		found = sorted((dist, n) for dist, n in self._distances(cells, x, y) if range_level(dist) <= level)
+		return [(dist, self.stars[n]) for dist, n in found if self.stars[n] is not origin]
+
+
+# {positions: (distances, levels)}, least recently used first. Each entry takes 16 bytes per pair of stars,
+# so we bound both the number of entries and their total size.
+_matrix_cache = OrderedDict()
+MATRIX_CACHE_SIZE = 4
+MATRIX_CACHE_BYTES = 256 * 1024**2
+
+def distance_matrices(stars):
+	"""Return (distances, levels) for all pairs of given stars, as numpy arrays.
+	distances[i, j] is the distance between stars[i] and stars[j],
+	and levels[i, j] is the minimum range level needed to travel between them (as per range_level).
+	Since stars never move, results are cached by star positions and may be shared between
+	different snapshots of the same game. Only the most recently used few are kept (up to MATRIX_CACHE_SIZE
+	of them, totalling at most MATRIX_CACHE_BYTES, though the latest is always kept).
+	The returned arrays are read-only.
+	"""
+	import numpy
+	positions = tuple((star.x, star.y) for star in stars)
+	if positions in _matrix_cache:
+		# move to the end, as the most recently used
+		_matrix_cache[positions] = result = _matrix_cache.pop(positions)
+		return result
+	xy = numpy.array(positions, dtype=float).reshape(-1, 2)
+	dx = xy[:, 0, None] - xy[None, :, 0]
+	dy = xy[:, 1, None] - xy[None, :, 1]
+	distances = numpy.sqrt(dx*dx + dy*dy)
+	levels = numpy.maximum(numpy.ceil(distances) - 3, 1).astype(int)
+	distances.flags.writeable = levels.flags.writeable = False
+	_matrix_cache[positions] = distances, levels
+	while len(_matrix_cache) > 1 and (len(_matrix_cache) > MATRIX_CACHE_SIZE or _matrix_cache_bytes() > MATRIX_CACHE_BYTES):
+		_matrix_cache.popitem(last=False)
+	return distances, levels
+
+def _matrix_cache_bytes():
+	return sum(distances.nbytes + levels.nbytes for distances, levels in _matrix_cache.values())
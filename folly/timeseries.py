@@ -0,0 +1,215 @@
+"""Per-player stats for a game over time, for looking at trends without replaying snapshots.
+
+A PlayerSeries holds, for every tick and every player, the stats in PlayerSeries.STATS:
+total economy, industry, science, ships, stars and fleets, and the level of each tech.
+They are held in a single numpy array indexed by [tick - first_tick, player_id, stat],
+with any tick we don't have data for filled with MISSING. For example, to get player 3's
+ship count over the last 200 ticks:
+	series.get('ships', 3, series.end_tick - 200)
+which is a slice of the array, not a copy.
+
+Stats can be added from galaxy snapshots (add_galaxy()), or from intel data (add_intel()),
+which can fill in ticks from before we started watching a game.
+
+It is saved in a compact binary format: a small header followed by the raw array.
+Saving again only writes the ticks that changed since the last save, as long as the shape is the same.
+Requires numpy.
+"""
+
+import os
+import struct
+
+import numpy
+
+
+class PlayerSeries(object):
+
+	STATS = ('economy', 'industry', 'science', 'ships', 'stars', 'fleets',
+	         'banking', 'manufacturing', 'propulsion', 'research', 'scanning', 'terraforming', 'weapons')
+	TECHS = STATS[6:]
+	# key in player data for each non-tech stat
+	PLAYER_KEYS = {
+		'economy': 'total_economy',
+		'industry': 'total_industry',
+		'science': 'total_science',
+		'ships': 'total_strength',
+		'stars': 'total_stars',
+		'fleets': 'total_fleets',
+	}
+	MISSING = -1
+	DTYPE = numpy.dtype('<i4')
+
+	# magic, version, first tick, number of ticks, number of players, number of stats
+	HEADER = struct.Struct('<4sIiIII')
+	MAGIC = 'NPTS'
+	VERSION = 1
+
+	def __init__(self, num_players=0, first_tick=0):
+		self.first_tick = first_tick
+		self._length = 0
+		self._values = numpy.full((16, num_players, len(self.STATS)), self.MISSING, dtype=self.DTYPE)
+		# (path, number of ticks that have not changed since it was saved). The number is None if the saved file
+		# can't be updated in place (eg. every row has moved), and must be rewritten.
+		self._saved = None, None
+
+	def __str__(self):
+		return "<PlayerSeries of {} players for ticks {}-{}>".format(self.num_players, self.first_tick, self.end_tick)
+	def __repr__(self):
+		return str(self)
+
+	def __len__(self):
+		return self._length
+
+	@property
+	def num_players(self):
+		return self._values.shape[1]
+
+	@property
+	def end_tick(self):
+		"""One past the last tick covered"""
+		return self.first_tick + self._length
+
+	@property
+	def ticks(self):
+		"""Array of the tick for each row"""
+		return numpy.arange(self.first_tick, self.end_tick)
+
+	@property
+	def values(self):
+		"""The whole array, indexed by [tick - first_tick, player_id, stat index]. Don't modify it."""
+		return self._values[:self._length]
+
+	def stat_index(self, stat):
+		return self.STATS.index(stat)
+
+	def get(self, stat, player_id=None, start=None, end=None):
+		"""Returns the values of stat for ticks start (inclusive) to end (exclusive), for given player
+		or (if player_id is None) as a 2d array indexed by [tick - start, player_id].
+		start and end default to the first and end tick, and are clipped to them. Missing ticks are MISSING."""
+		start = self.first_tick if start is None else max(start, self.first_tick)
+		end = self.end_tick if end is None else min(end, self.end_tick)
+		rows = slice(start - self.first_tick, max(end, start) - self.first_tick)
+		if player_id is None:
+			return self._values[rows, :, self.stat_index(stat)]
+		return self._values[rows, player_id, self.stat_index(stat)]
+
+	def has(self, tick):
+		"""Whether we have data for given tick"""
+		return self.first_tick <= tick < self.end_tick and (self._values[tick - self.first_tick] != self.MISSING).any()
+
+	def missing_ticks(self, start=None, end=None):
+		"""Returns an array of ticks between start and end (defaulting to the first and end ticks) with no data"""
+		start = self.first_tick if start is None else start
+		end = self.end_tick if end is None else end
+		ticks = numpy.arange(start, max(start, end))
+		present = numpy.zeros(len(ticks), dtype=bool)
+		lo, hi = max(start, self.first_tick), min(end, self.end_tick)
+		if lo < hi:
+			present[lo - start:hi - start] = (self._values[lo - self.first_tick:hi - self.first_tick] != self.MISSING).any(axis=(1, 2))
+		return ticks[~present]
+
+	def _row(self, tick, num_players):
+		"""Returns the row index for given tick, growing the array as needed to cover it and num_players."""
+		if not self._length:
+			self.first_tick = tick
+		if tick < self.first_tick:
+			# grow at the front, which moves every row
+			extra = self.first_tick - tick
+			self._resize(self._length + extra, num_players, shift=extra)
+			self._length += extra
+			self.first_tick = tick
+			self._saved = self._saved[0], None
+		row = tick - self.first_tick
+		if row >= self._values.shape[0] or num_players > self.num_players:
+			self._resize(row + 1, num_players)
+		if row >= self._length:
+			self._length = row + 1
+		return row
+
+	def _resize(self, min_rows, num_players, shift=0):
+		old = self._values
+		capacity = old.shape[0]
+		while capacity < min_rows:
+			capacity *= 2
+		num_players = max(num_players, old.shape[1])
+		self._values = numpy.full((capacity, num_players, len(self.STATS)), self.MISSING, dtype=self.DTYPE)
+		self._values[shift:shift + self._length, :old.shape[1]] = old[:self._length]
+		if num_players != old.shape[1]:
+			self._saved = self._saved[0], None
+
+	def set(self, tick, values):
+		"""Set the stats for given tick. values should be indexed by [player_id, stat index]."""
+		values = numpy.asarray(values, dtype=self.DTYPE)
+		row = self._row(tick, len(values))
+		self._values[row, :len(values)] = values
+		path, saved = self._saved
+		self._saved = path, min(saved, row) if saved is not None else None
+
+	def add_galaxy(self, galaxy):
+		"""Add the stats from given galaxy snapshot. This reads the galaxy's data directly, without making
+		any Player objects."""
+		players = galaxy.data.players
+		values = numpy.full((len(players), len(self.STATS)), self.MISSING, dtype=self.DTYPE)
+		for player_id in players:
+			player = players.raw(player_id)
+			row = values[int(player_id)]
+			for n, stat in enumerate(self.STATS[:len(self.PLAYER_KEYS)]):
+				row[n] = player.get(self.PLAYER_KEYS[stat], self.MISSING)
+			tech = player.get('tech', {})
+			for n, name in enumerate(self.TECHS, len(self.PLAYER_KEYS)):
+				if name in tech:
+					row[n] = tech[name]['level']
+		self.set(galaxy.tick, values)
+
+	def add_intel(self, points, overwrite=False):
+		"""Add the stats from an iterable of intel.IntelPoint (eg. from intel.intel_data()).
+		Unless overwrite=True, ticks we already have data for are skipped, so that points only fill in gaps.
+		Returns the number of ticks added."""
+		added = 0
+		for point in points:
+			if not overwrite and self.has(point.tick): continue
+			values = numpy.full((max(player.player_id for player in point.players) + 1, len(self.STATS)),
+			                    self.MISSING, dtype=self.DTYPE)
+			for player in point.players:
+				values[player.player_id] = [getattr(player, stat) for stat in self.STATS]
+			self.set(point.tick, values)
+			added += 1
+		return added
+
+	def save(self, path):
+		"""Save to given path. If it was last saved to (or loaded from) the same path, the number of players
+		hasn't changed and no ticks were added before the first, only the ticks that changed are written.
+		Otherwise a new file is written and renamed into place."""
+		saved_path, unchanged = self._saved
+		header = self.HEADER.pack(self.MAGIC, self.VERSION, self.first_tick, self._length,
+		                          self.num_players, len(self.STATS))
+		if saved_path == path and unchanged is not None and os.path.exists(path):
+			row_size = self.num_players * len(self.STATS) * self.DTYPE.itemsize
+			with open(path, 'r+b') as f:
+				f.write(header)
+				f.seek(self.HEADER.size + unchanged * row_size)
+				f.write(self._values[unchanged:self._length].tobytes())
+				f.truncate()
+		else:
+			# write a new file and swap it in, so we never leave a half-written file behind
+			tmp_path = path + '.tmp'
+			with open(tmp_path, 'wb') as f:
+				f.write(header)
+				f.write(self.values.tobytes())
+			os.rename(tmp_path, path)
+		self._saved = path, self._length
+
+	@classmethod
+	def load(cls, path):
+		with open(path, 'rb') as f:
+			raw = f.read()
+		magic, version, first_tick, length, num_players, num_stats = cls.HEADER.unpack_from(raw)
+		if magic != cls.MAGIC or version != cls.VERSION or num_stats != len(cls.STATS):
+			raise ValueError("{!r} is not a version {} player series file".format(path, cls.VERSION))
+		series = cls(num_players, first_tick)
+		values = numpy.frombuffer(raw, dtype=cls.DTYPE, offset=cls.HEADER.size, count=length * num_players * num_stats)
+		series._resize(length, num_players)
+		series._values[:length] = values.reshape(length, num_players, num_stats)
+		series._length = length
+		series._saved = path, length
+		return series
@@ -0,0 +1,67 @@
+"""Working with the differences between consecutive snapshots of galaxy data.
+
+Most of a galaxy's data doesn't change from one tick to the next, so we can save a lot of space by
+only storing what changed (a delta), and save a lot of memory by letting consecutive snapshots
+share the parts that didn't change.
+
+A delta is a dict which may have keys:
+	s: {key: value} for keys that were added or changed
+	d: [key] for keys that were removed
+	c: {key: delta} for keys whose values are dicts in both, which changed inside
+Values that aren't dicts (including lists) are always replaced whole.
+
+Note that shared data must not be modified, or the change will show up in every snapshot sharing it.
+"""
+
+
+def diff(old, new):
+	"""Returns a delta which turns dict old into dict new, or None if they are equal."""
+	delta = {}
+	for key, value in dict.iteritems(new):
+		if key not in old:
+			delta.setdefault('s', {})[key] = value
+			continue
+		old_value = dict.__getitem__(old, key)
+		if value is old_value:
+			continue
+		if isinstance(value, dict) and isinstance(old_value, dict):
+			sub_delta = diff(old_value, value)
+			if sub_delta is not None:
+				delta.setdefault('c', {})[key] = sub_delta
+		elif value != old_value:
+			delta.setdefault('s', {})[key] = value
+	removed = [key for key in old if key not in new]
+	if removed:
+		delta['d'] = removed
+	return delta or None
+
+
+def patch(old, delta):
+	"""Returns a new dict made by applying delta to old. Parts of old that weren't changed are shared, not copied.
+	The result has the same type as old."""
+	new = type(old)(old)
+	if delta is None:
+		return new
+	for key in delta.get('d', ()):
+		del new[key]
+	new.update(delta.get('s', {}))
+	for key, sub_delta in delta.get('c', {}).iteritems():
+		dict.__setitem__(new, key, patch(dict.__getitem__(old, key), sub_delta))
+	return new
+
+
+def share(old, new):
+	"""Modifies new so that each value in it that is equal to the one in the same place in old is replaced by
+	the one from old. Dicts that aren't equal are shared recursively. This means data that didn't change
+	between two snapshots (right down to individual strings) is only held in memory once.
+	Returns new."""
+	for key in new.keys():
+		value = dict.__getitem__(new, key)
+		old_value = dict.get(old, key)
+		if value is old_value or type(value) is not type(old_value):
+			continue
+		if value == old_value:
+			dict.__setitem__(new, key, old_value)
+		elif isinstance(value, dict):
+			share(old_value, value)
+	return new
@@ -0,0 +1,147 @@
+import os
+import struct
+import logging
+from collections import OrderedDict
+
+from folly.galaxy import Galaxy
+from folly.timeseries import PlayerSeries
+
+from delta import share
+from store import READ_ERRORS
+
+
+class History(object):
+	"""The sequence of galaxies seen for a game, oldest first, backed by a SnapshotStore.
+	Only the most recently used galaxies (up to window of them) are kept in memory. Others are evicted,
+	and loaded back from the store when asked for.
+	history[n] gives the nth galaxy (negative indexes count from the latest), and history.latest and
+	history.previous give the last two.
+	A snapshot that can't be read from the store (eg. a corrupt segment) is treated as missing: history[n] is None
+	for it, and a warning is logged.
+	Galaxies that could not be saved are kept in memory (and never evicted) until a later save succeeds.
+	history.series is a PlayerSeries of every galaxy's player stats, kept up to date as galaxies are added
+	and saved alongside the store. Ticks we have no galaxy for can be filled in from intel data with backfill().
+	"""
+
+	SERIES_FILE = 'players.series'
+
+	def __init__(self, store, game_number, window=24, logger=None):
+		"""logger is where warnings about unreadable snapshots go. It defaults to this module's logger."""
+		self.store = store
+		self.game_number = game_number
+		self.window = window
+		self.logger = logger or logging.getLogger(__name__)
+		self._resident = OrderedDict() # {position: galaxy}, least recently used first
+		self._unsaved = [] # galaxies after the end of the store
+		self._unreadable = set() # positions in the store that failed to read, so we only try (and warn) once
+		self.series_path = os.path.join(store.directory, self.SERIES_FILE)
+		self.series = self._load_series()
+
+	def _load_series(self):
+		"""Load the saved series, and add anything in the store that it's missing
+		(eg. if it was never saved, or we crashed between saving a galaxy and saving the series)."""
+		try:
+			series = PlayerSeries.load(self.series_path)
+		except (IOError, OSError, ValueError, struct.error):
+			series = PlayerSeries()
+		missing = [n for n, entry in enumerate(self.store.index) if not series.has(entry.tick)]
+		for n in missing:
+			galaxy = self._load(n)
+			if galaxy is not None:
+				series.add_galaxy(galaxy)
+		if missing:
+			series.save(self.series_path)
+		return series
+
+	def backfill(self, points):
+		"""Fill in any ticks missing from the series from an iterable of intel.IntelPoint, and save it.
+		Returns the number of ticks filled."""
+		filled = self.series.add_intel(points)
+		if filled:
+			self.series.save(self.series_path)
+		return filled
+
+	def __str__(self):
+		return "<History of game {self.game_number}: {n} galaxies, {resident} in memory>".format(
+		       self=self, n=len(self), resident=len(self._resident))
+	def __repr__(self):
+		return str(self)
+
+	def __len__(self):
+		return len(self.store) + len(self._unsaved)
+
+	def __getitem__(self, n):
+		if n < 0: n += len(self)
+		if not 0 <= n < len(self): raise IndexError(n)
+		if n in self._resident:
+			galaxy = self._resident.pop(n)
+		elif n >= len(self.store):
+			galaxy = self._unsaved[n - len(self.store)]
+		else:
+			galaxy = self._load(n)
+			if galaxy is None: return None
+		self._resident[n] = galaxy
+		self._evict()
+		return galaxy
+
+	def _load(self, n):
+		"""Read the nth galaxy from the store, or return None (with a warning the first time) if it can't be read"""
+		if n in self._unreadable: return None
+		try:
+			return Galaxy(game_number=self.game_number, from_data=self.store[n])
+		except READ_ERRORS:
+			self.logger.warning("Failed to read galaxy {} of {}, treating it as missing".format(n, self.store), exc_info=True)
+			self._unreadable.add(n)
+			return None
+
+	def __iter__(self):
+		for n in range(len(self)):
+			yield self[n]
+
+	@property
+	def latest(self):
+		"""The latest galaxy, or None if there are none or it can't be read"""
+		return self[-1] if self else None
+
+	@property
+	def previous(self):
+		"""The galaxy before the latest one, or None if there isn't one or it can't be read"""
+		return self[-2] if len(self) > 1 else None
+
+	def at(self, now):
+		"""Returns the latest galaxy at or before given time (in epoch seconds), or None
+		(including if that galaxy can't be read)"""
+		for n in range(len(self) - 1, len(self.store) - 1, -1):
+			if self[n].now <= now: return self[n]
+		n = self.store.find(now)
+		return None if n is None else self[n]
+
+	def append(self, galaxy):
+		"""Add a new latest galaxy, sharing its unchanged data with the previous latest one, and save it.
+		Does nothing if galaxy is at the same time as the latest one. If the latest can't be read, nothing is shared.
+		May raise IOError or OSError if it can't be saved, in which case it's still added, and saved later."""
+		latest = self.latest
+		if latest is not None:
+			if galaxy.now == latest.now: return
+			share(latest.data, galaxy.data)
+		self._unsaved.append(galaxy)
+		self._resident[len(self) - 1] = galaxy
+		self.series.add_galaxy(galaxy)
+		try:
+			self.save()
+		finally:
+			self._evict()
+
+	def save(self):
+		"""Save any unsaved galaxies, and the series"""
+		while self._unsaved:
+			self.store.append(self._unsaved[0].data)
+			self._unsaved.pop(0)
+		self.series.save(self.series_path)
+
+	def _evict(self):
+		# unsaved galaxies are always resident, and don't count towards the window
+		while len(self._resident) > self.window + len(self._unsaved):
+			n, galaxy = self._resident.popitem(last=False)
+			if n >= len(self.store):
+				self._resident[n] = galaxy # can't be evicted, put it back
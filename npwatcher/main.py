@@ -1,25 +1,36 @@
+from gevent import monkey; monkey.patch_all() # so that fetches for different games can run concurrently
+
 import os
+import time
 import logging
 from getpass import getpass
 
-import simplejson as json
+import requests
 from scriptlib import with_argv
 import gevent
 import gevent.event
+import gevent.lock
 
 from folly.galaxy import Galaxy
 from folly.helpers import dotdict
+from folly.request import decode_json, Client, RequestError
+from folly.intel import intel_data
 
 import emailer
+from store import SnapshotStore
+from history import History
 from reportsystem import report_list
 import reports
 
 GALAXY_CACHE_PATH = '/var/lib/npwatcher/galaxies'
 RETRY_INTERVAL = 60
+MAX_RETRY_INTERVAL = 3600
+MAX_CONCURRENT_FETCHES = 4
+HISTORY_WINDOW = 24
 SENDER_EMAIL = 'secondary.mikelang3000@gmail.com'
 TARGET_EMAIL = 'mikelang3000@gmail.com'
 
-force_refresh = gevent.event.Event()
+watchers = {} # {game_number: GameWatcher}
 
 def setup_logging():
 	global logger, report_logger, report_handler
@@ -39,79 +50,180 @@ def setup_logging():
 	fmt = "%(name)s:%(levelname)s: %(message)s"
 	report_handler.setFormatter(logging.Formatter(fmt))
 
-def load_galaxies(game_number):
-	galaxies = {}
-	directory = os.path.join(GALAXY_CACHE_PATH, game_number)
-	for filename in os.listdir(directory):
+def import_legacy_galaxies(store, directory):
+	"""Move any galaxies saved by older versions (as one JSON file each) from directory into store"""
+	filenames = [filename for filename in os.listdir(directory) if filename.endswith('.json')]
+	for filename in sorted(filenames, key=lambda filename: float(filename[:-len('.json')])):
+		filepath = os.path.join(directory, filename)
 		try:
-			filepath = os.path.join(directory, filename)
 			with open(filepath) as f:
-				data = json.loads(f.read(), object_hook=dotdict)
-			galaxy = Galaxy(from_data=data)
-		except (OSError, IOError, json.JSONDecodeError):
-			logger.warning("Failed to load galaxy {!r}".format(filepath), exc_info=True)
-		if galaxy.now in galaxies:
-			logger.warning("Duplicate galaxy ({}) for time {:.2f}".format(
-			               'equal' if galaxy == galaxies[galaxy.now] else 'differs',
-			               galaxy.now))
-		galaxies[galaxy.now] = galaxy
-	return galaxies
-
-def save_galaxy(galaxy):
-	filepath = os.path.join(GALAXY_CACHE_PATH, galaxy.game_number, "{:.2f}.json".format(galaxy.now))
-	if not os.path.exists(os.path.dirname(filepath)):
-		os.makedirs(os.path.dirname(filepath))
-	with open(filepath, 'w') as f:
-		f.write(json.dumps(galaxy.data))
-
-@with_argv
-def main(game_number=None):
-	if not game_number: game_number = os.environ['NP_GAME_NUMBER']
-	setup_logging()
-
-	try:
-		galaxies = load_galaxies(game_number)
-	except (OSError, IOError):
-		logger.warning("Failed to load galaxies", exc_info=True)
-		galaxies = {}
-
-	while True:
-
-		logger.debug("Fetching galaxy")
+				data = decode_json(f.read())
+		except (OSError, IOError, ValueError):
+			logger.warning("Failed to import galaxy {!r}".format(filepath), exc_info=True)
+			continue
+		store.append(data)
+		os.remove(filepath)
+	if filenames:
+		logger.info("Imported {} galaxies from {!r}".format(len(filenames), directory))
+
+class GameWatcher(object):
+	"""Watches a single game: fetches it each tick, saves it and runs the reports on it.
+	On startup, player stats for any ticks it missed are backfilled from the intel data.
+	Many watchers may run at once (each in its own greenlet), sharing a client and a limit on concurrent fetches.
+	An unexpected error in one watcher restarts that watcher, without affecting the others (see run()).
+	After each cycle, self.stats holds timings for it (all in seconds):
+		wait: Time spent waiting for a free fetch slot
+		fetch: Time to fetch and decode the galaxy, once a slot was free
+		reports: Time to run all reports
+		failures: Number of failed fetch attempts before this one succeeded
+	"""
+
+	def __init__(self, game_number, client, fetch_slots, window=HISTORY_WINDOW):
+		"""fetch_slots should be a semaphore shared between all watchers, that bounds how many fetch at once.
+		window is the number of galaxies to keep in memory, see History."""
+		self.game_number = game_number
+		self.window = window
+		self.client = client
+		self.fetch_slots = fetch_slots
+		self.force_refresh = gevent.event.Event()
+		self.logger = logger.getChild(game_number)
+		self.stats = dotdict()
+		self.store = None
+
+	def __str__(self):
+		return "<GameWatcher {}>".format(self.game_number)
+	def __repr__(self):
+		return str(self)
+
+	def run(self):
+		"""Watch the game forever. If watching fails with an unexpected error, it is logged and we start again
+		(re-opening the store) after a delay. Consecutive failures without completing a cycle in between
+		back off exponentially, from RETRY_INTERVAL up to MAX_RETRY_INTERVAL."""
+		failures = 0
+		while True:
+			self.cycles = 0
+			try:
+				self.watch()
+			except Exception:
+				if self.cycles: failures = 0
+				interval = min(RETRY_INTERVAL * 2**failures, MAX_RETRY_INTERVAL)
+				self.logger.exception("Watcher failed, restarting in {} seconds".format(interval))
+				failures += 1
+			finally:
+				if self.store is not None:
+					self.store.close()
+			gevent.sleep(interval)
+
+	def watch(self):
+		self.store = SnapshotStore(os.path.join(GALAXY_CACHE_PATH, self.game_number))
+		import_legacy_galaxies(self.store, self.store.directory)
+		self.history = History(self.store, self.game_number, self.window, self.logger)
+		self.backfill()
+
+		forced = False
+		while True:
+			galaxy = self.fetch(forced)
+			try:
+				self.history.append(galaxy)
+			except (IOError, OSError):
+				self.logger.warning("Could not save galaxy", exc_info=True)
+
+			self.run_reports(galaxy)
+			self.logger.info("Fetched in {stats.fetch:.2f}s (after waiting {stats.wait:.2f}s for a slot "
+			                 "and {stats.failures} failures), reports took {stats.reports:.2f}s".format(stats=self.stats))
+
+			minutes_to_tick = (1 - galaxy.tick_fragment) * galaxy.tick_rate # tick_fragment is a fraction of a tick
+			forced = self.force_refresh.wait(minutes_to_tick * 60 + 10) # we wait an extra 10sec to avoid nasty race cdns with the server
+			if forced:
+				self.logger.info("Forced refresh")
+			self.force_refresh.clear()
+			self.cycles += 1
+
+	def fetch(self, refresh=False):
+		"""Fetch the galaxy, retrying until it succeeds. Consecutive failures back off exponentially,
+		from RETRY_INTERVAL up to MAX_RETRY_INTERVAL."""
+		self.logger.debug("Fetching galaxy")
+		failures = 0
 		galaxy = None
-		first_attempt = True
-		while not galaxy:
+		while galaxy is None:
+			wait_start = time.time()
+			with self.fetch_slots:
+				fetch_start = time.time()
+				try:
+					galaxy = Galaxy(game_number=self.game_number, client=self.client, refresh=refresh)
+				except (RequestError, requests.RequestException, ValueError):
+					# ValueError is for a response that isn't valid JSON
+					interval = min(RETRY_INTERVAL * 2**failures, MAX_RETRY_INTERVAL)
+					level = logging.ERROR if not failures else logging.DEBUG
+					self.logger.log(level, "Failed to fetch galaxy, retrying in {} seconds".format(interval), exc_info=True)
+					failures += 1
+				fetch_end = time.time()
+			if galaxy is None:
+				gevent.sleep(interval)
+		self.stats.update(wait=fetch_start - wait_start, fetch=fetch_end - fetch_start, failures=failures)
+		return galaxy
+
+	def backfill(self):
+		"""Fill in the stats for any ticks we missed (eg. while not running) from the game's intel data.
+		This is a single request for the whole game, much cheaper than a galaxy per tick. Failure isn't fatal,
+		we just go without."""
+		with self.fetch_slots:
 			try:
-				galaxy = Galaxy(game_number=game_number)
-			except RequestError as ex:
-				level = logging.ERROR if first_attempt else logging.DEBUG
-				logger.log(level, "Failed to fetch galaxy, retrying in {} seconds".format(RETRY_INTERVAL),
-				           exc_info=True)
-				first_attempt = False
-				gevent.sleep(RETRY_INTERVAL)
-
+				points = intel_data(game_number=self.game_number, client=self.client)
+			except (RequestError, requests.RequestException, ValueError):
+				self.logger.warning("Failed to fetch intel data, not backfilling stats", exc_info=True)
+				return
 		try:
-			save_galaxy(galaxy)
+			filled = self.history.backfill(points)
 		except (IOError, OSError):
-			logger.warning("Could not save galaxy", exc_info=True)
-		galaxies[galaxy.now] = galaxy
-
+			self.logger.warning("Could not save backfilled stats", exc_info=True)
+			return
+		except (KeyError, TypeError, ValueError):
+			# a point is missing a stat, or has the wrong type for one
+			self.logger.warning("Unexpected intel data, not backfilling stats", exc_info=True)
+			return
+		self.logger.info("Backfilled stats for {} ticks from intel data".format(filled))
+
+	def run_reports(self, galaxy):
+		# Reports are all CPU-bound, so no other watcher can run (and log to the report handler)
+		# until we have sent this game's report.
+		start = time.time()
 		for report in report_list:
 			try:
-				report(galaxies)
+				report(self.history)
 			except Exception:
 				report.logger.exception("Report failed to run")
+		self.stats.reports = time.time() - start
 
 		report_handler.send("npwatcher report for {cycle}:{tick} of game {game_number}".format(
 			cycle = galaxy.productions,
 			tick = galaxy.production_counter,
-			game_number = game_number,
+			game_number = self.game_number,
 		))
 
-		minutes_to_tick = galaxy.tick_rate - galaxy.tick_fragment
-		if force_refresh.wait(minutes_to_tick * 60 + 10): # we wait an extra 10sec to avoid nasty race cdns with the server
-			logger.info("Forced refresh")
-		force_refresh.clear()
+
+def force_refresh(*game_numbers):
+	"""Force the given games (or all games, if none given) to refresh now."""
+	for game_number, watcher in watchers.items():
+		if not game_numbers or game_number in game_numbers:
+			watcher.force_refresh.set()
+
+
+@with_argv
+def main(*game_numbers, **options):
+	"""Watch the given games, or those in NP_GAME_NUMBER (comma-seperated) if none given.
+	Options:
+		--window=N: Keep up to N galaxies per game in memory (default HISTORY_WINDOW)"""
+	if not game_numbers: game_numbers = os.environ['NP_GAME_NUMBER'].split(',')
+	window = int(options.pop('window', HISTORY_WINDOW))
+	if options: raise TypeError("Unknown options: {}".format(', '.join(options)))
+	setup_logging()
+
+	client = Client(pool_size=MAX_CONCURRENT_FETCHES)
+	fetch_slots = gevent.lock.BoundedSemaphore(MAX_CONCURRENT_FETCHES)
+	for game_number in game_numbers:
+		watchers[game_number] = GameWatcher(game_number, client, fetch_slots, window)
+	gevent.joinall([gevent.spawn(watcher.run) for watcher in watchers.values()], raise_error=True)
 
 if __name__=='__main__':
 	main()
@@ -3,73 +3,73 @@ from reportsystem import Report
 
 class CompareReport(Report):
 	"""Specific case of report where we only want to compare against previous tick.
-	Will pass in args (logger, current_galaxy, previous_galaxy).
+	Will pass in args (logger, diff), where diff is a GalaxyDiff from the previous galaxy to the current one.
+	The current and previous galaxies are available as diff.galaxy and diff.old.
+	The diff is shared between all CompareReports, so each change is only worked out once.
 	previous is not guarenteed to be 1 tick behind, for example after a failure or force refresh.
 	If no previous available, the report will not be called.
 	"""
-	def __call__(self, galaxies):
-		galaxies = sorted(galaxies.values(), key=lambda g: g.now)
-		if len(galaxies) < 2: return
-		self.fn(self.logger, galaxies[-1], galaxies[-2])
+	def __call__(self, history):
+		previous = history.previous
+		if previous is None: return
+		self.fn(self.logger, history.latest.diff(previous))
 
 
 @CompareReport
-def check_tick_count(logger, galaxy, oldgalaxy):
-	if galaxy.tick != oldgalaxy.tick + 1:
-		logger.warning("Most recent galaxy is {} ticks behind, not 1. Some values may be strange.".format(galaxy.tick - oldgalaxy.tick))
-		if galaxy.paused or oldgalaxy.paused:
+def check_tick_count(logger, diff):
+	if diff.ticks != 1:
+		logger.warning("Most recent galaxy is {} ticks behind, not 1. Some values may be strange.".format(diff.ticks))
+		if diff.galaxy.paused or diff.old.paused:
 			logger.info("Likely explanation: Either galaxy is paused.")
 
 @CompareReport
-def incoming_fleets(logger, galaxy, oldgalaxy):
-	for fleet in galaxy.fleets.values():
-		if fleet.player == galaxy.player: continue
-		for star in fleet.waypoints:
-			if star.owner != galaxy.player: continue
-			# check if it was new this tick
-			if fleet.fleet_id in oldgalaxy.fleets:
-				old_waypoints = oldgalaxy.fleets[fleet.fleet_id].waypoints
-				if any(star.star_id == s.star_id for s in old_waypoints):
-					continue # it isn't new, ignore
-			# it is new
-			logger.warning("INCOMING! {fleet.owner.name}'s fleet {fleet.name} is attacking {star.name} with {fleet.ships} ships, and arrives in {eta} ticks".format(
-				fleet=fleet, star=star, eta=dict(zip(fleet.waypoints, fleet.eta))[star]
-			))
+def incoming_fleets(logger, diff):
+	galaxy, oldgalaxy = diff.galaxy, diff.old
+	# (fleet_id, star_id) for every waypoint of every fleet we could already see last time
+	old_waypoints = oldgalaxy.fleet_etas.index
+	etas = galaxy.fleet_etas
+	me = galaxy.data.player_uid
+	for fleet_id, star_id, eta in etas:
+		if (fleet_id, star_id) in old_waypoints: continue # it isn't new, ignore
+		if eta != etas.get(fleet_id, star_id): continue # only report the first visit to each star
+		star = galaxy.stars_by_id[star_id]
+		if star.data.puid != me: continue
+		fleet = galaxy.fleets[fleet_id]
+		if fleet.data.puid == me: continue
+		# it is new
+		logger.warning("INCOMING! {fleet.owner.name}'s fleet {fleet.name} is attacking {star.name} with {fleet.ships} ships, and arrives in {eta} ticks".format(
+			fleet=fleet, star=star, eta=eta
+		))
 
 @CompareReport
-def star_ownership(logger, galaxy, oldgalaxy):
-	for star, old_star in zip(galaxy.stars, oldgalaxy.stars):
-		if star.puid != old_star.puid:
-			if old_star.puid == -1: 
-				logger.info("{0.player.name} colonised {0.name}".format(star, old_star))
-			else:
-				logger.info("{0.player.name} captured {0.name} from {1.player.name}".format(star, old_star))
+def star_ownership(logger, diff):
+	for star, old_star in diff.ownership_changes:
+		if old_star.puid == -1:
+			logger.info("{0.player.name} colonised {0.name}".format(star, old_star))
+		else:
+			logger.info("{0.player.name} captured {0.name} from {1.player.name}".format(star, old_star))
 
 @CompareReport
-def players_tech(logger, galaxy, oldgalaxy):
-	for player, old_player in zip(galaxy.players, oldgalaxy.players):
-		for tech_name in player.tech:
-			tech = player.tech[tech_name]
-			old_tech = old_player.tech[tech_name]
-			if tech.level != old_tech.level:
-				logger.info("{player.name} upgraded {tech.name} tech {old_tech.level} -> {tech.level}".format(player=player, old_tech=old_tech, tech=tech))
+def players_tech(logger, diff):
+	for player, tech, old_tech in diff.tech_changes:
+		logger.info("{player.name} upgraded {tech.name} tech {old_tech.level} -> {tech.level}".format(player=player, old_tech=old_tech, tech=tech))
 
 @CompareReport
-def players_core_stats(logger, galaxy, oldgalaxy):
-	for player, old_player in zip(galaxy.players, oldgalaxy.players):
+def players_core_stats(logger, diff):
+	for player, old_player in diff.players:
+		deltas = diff.stat_deltas.get(player, {})
 		for attr in ('economy', 'industry', 'science', 'total_fleets'):
-			oldval = getattr(old_player, attr)
-			newval = getattr(player, attr) 
+			delta = deltas.get(attr, 0)
 			attrname = 'fleets' if attr == 'total_fleets' else attr
-			if oldval > newval:
-				logger.info("{player.name} has lost {loss} {attr}".format(player=player, attr=attrname, loss=oldval-newval))
-			elif newval > oldval:
-				logger.info("{player.name} has gained {gain} {attr}".format(player=player, attr=attrname, gain=newval-oldval))
+			if delta < 0:
+				logger.info("{player.name} has lost {loss} {attr}".format(player=player, attr=attrname, loss=-delta))
+			elif delta > 0:
+				logger.info("{player.name} has gained {gain} {attr}".format(player=player, attr=attrname, gain=delta))
 
 @CompareReport
-def unexpected_ship_counts(logger, galaxy, oldgalaxy):
+def unexpected_ship_counts(logger, diff):
 	SHIP_CHANGE_THRESHOLD = 4 
-	for player, old_player in zip(galaxy.players, oldgalaxy.players):
+	for player, old_player in diff.players:
 		missing = int(old_player.ships + old_player.ship_rate) - player.ships
 		if missing > SHIP_CHANGE_THRESHOLD:
 			logger.info("{player.name} missing {missing} ships - possible battle?".format(player=player, missing=missing))
@@ -4,7 +4,9 @@ report_list = []
 
 class Report(object):
 	"""Reports should log to their self.logger instance.
-	Logs are aggregated and a report email is sent."""
+	Logs are aggregated and a report email is sent.
+	Reports are called with the game's History (see history.py), and a plain function report
+	is called as fn(logger, history)."""
 	def __init__(self, fn=None, name=None):
 		"""Can be optionally used as a decorator, or a subclass can override __call__ directly.
 		name can be passed in explicitly, or is taken from the name of the fn, or the class name is used.
@@ -15,7 +17,7 @@ class Report(object):
 		if fn and not self.name: self.name = fn.__name__
 		if not self.name: self.name = self.__class__.__name__
 		self.logger = logging.getLogger('npwatcher.reports').getChild(self.name)
-	def __call__(self, galaxies):
-		self.fn(self.logger, galaxies)
+	def __call__(self, history):
+		self.fn(self.logger, history)
 
 
@@ -0,0 +1,180 @@
+"""An append-only store of galaxy snapshots for a single game.
+
+Snapshots are stored zlib-compressed, one after another, in segment files (segment-000000.dat, ...).
+A new segment is started once the current one reaches SEGMENT_SIZE.
+Every KEYFRAME_INTERVAL snapshots, the full data is stored as JSON (a keyframe). The snapshots in between
+are stored as a delta from the snapshot before (see delta.py), marked by a leading DELTA_MARKER.
+Reading a snapshot means reading back to the last keyframe, then applying each delta in turn,
+so consecutive snapshots read from a store share all their unchanged data.
+Alongside them, index.dat holds a fixed-size record for every snapshot: (now, tick, segment, offset, length).
+Opening a store only reads the index. Snapshots are read (via mmap) and decoded when asked for.
+
+Snapshot data is written before its index record, so a crash while saving can at worst leave
+unindexed bytes at the end of a segment, or a partial index record, which is discarded on the next open.
+"""
+
+import os
+import mmap
+import zlib
+import struct
+import bisect
+from collections import namedtuple
+
+import simplejson as json
+
+from folly.request import decode_json
+
+from delta import diff, patch
+
+
+IndexEntry = namedtuple('IndexEntry', ['now', 'tick', 'segment', 'offset', 'length'])
+
+# what reading a snapshot may raise if its segment is missing, truncated or corrupt
+READ_ERRORS = (IOError, OSError, ValueError, zlib.error)
+
+
+class SnapshotStore(object):
+	"""Acts as a read-only sequence of galaxy data (in the order they were appended, which should be by time),
+	with append() to add a new one.
+	store.index is the list of IndexEntry for each snapshot. Note that now is in epoch seconds, as per Galaxy.now.
+	"""
+
+	INDEX_FORMAT = struct.Struct('<dIIQI')
+	INDEX_FILE = 'index.dat'
+	SEGMENT_FILE = 'segment-{:06d}.dat'
+	SEGMENT_SIZE = 64 * 1024**2
+	COMPRESSION_LEVEL = 6
+	KEYFRAME_INTERVAL = 24
+	DELTA_MARKER = 'D'
+
+	def __init__(self, directory):
+		self.directory = directory
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+		self._maps = {} # {segment: mmap}
+		self.index = []
+		self._nows = [] # now of each index entry, for searching
+		self._last_read = None, None, None # (position, data, deltas since keyframe) of the last snapshot read
+		self._read_index()
+
+	def __str__(self):
+		return "<SnapshotStore {!r}: {} snapshots>".format(self.directory, len(self))
+	def __repr__(self):
+		return str(self)
+
+	def __len__(self):
+		return len(self.index)
+
+	def __getitem__(self, n):
+		"""Returns the data of the nth snapshot. Raises one of READ_ERRORS if it can't be read."""
+		if n < 0: n += len(self)
+		if not 0 <= n < len(self): raise IndexError(n)
+		data, deltas = self._read(n)
+		return data
+
+	def _path(self, name):
+		return os.path.join(self.directory, name)
+
+	def _read_index(self):
+		path = self._path(self.INDEX_FILE)
+		if not os.path.exists(path): return
+		with open(path, 'rb') as f:
+			raw = f.read()
+		size = self.INDEX_FORMAT.size
+		complete = len(raw) - len(raw) % size
+		if complete != len(raw):
+			# partial record from an interrupted write
+			with open(path, 'r+b') as f:
+				f.truncate(complete)
+		self.index = [IndexEntry(*self.INDEX_FORMAT.unpack_from(raw, offset)) for offset in range(0, complete, size)]
+		self._nows = [entry.now for entry in self.index]
+
+	def append(self, data):
+		"""Compress and save the given galaxy data"""
+		position = len(self)
+		deltas = None
+		if self.index:
+			try:
+				last_data, last_deltas = self._read(position - 1)
+			except READ_ERRORS:
+				# we can't make a delta from a snapshot we can't read, so start afresh with a keyframe
+				last_deltas = self.KEYFRAME_INTERVAL
+			if last_deltas + 1 < self.KEYFRAME_INTERVAL:
+				deltas = last_deltas + 1
+				payload = self.DELTA_MARKER + json.dumps(diff(last_data, data))
+		if deltas is None:
+			deltas = 0
+			payload = json.dumps(data)
+		blob = zlib.compress(payload, self.COMPRESSION_LEVEL)
+
+		segment = self.index[-1].segment if self.index else 0
+		path = self._path(self.SEGMENT_FILE.format(segment))
+		if os.path.exists(path) and 0 < os.path.getsize(path) and os.path.getsize(path) + len(blob) > self.SEGMENT_SIZE:
+			segment += 1
+			path = self._path(self.SEGMENT_FILE.format(segment))
+		with open(path, 'ab') as f:
+			f.seek(0, os.SEEK_END)
+			offset = f.tell()
+			f.write(blob)
+			f.flush()
+			os.fsync(f.fileno())
+		entry = IndexEntry(data['now'] / 1000.0, data['tick'], segment, offset, len(blob))
+		with open(self._path(self.INDEX_FILE), 'ab') as f:
+			f.write(self.INDEX_FORMAT.pack(*entry))
+		self.index.append(entry)
+		self._nows.append(entry.now)
+		self._last_read = position, data, deltas
+		return entry
+
+	def _read_payload(self, entry):
+		"""Read and decompress the stored payload for given IndexEntry"""
+		mapped = self._maps.get(entry.segment)
+		if mapped is None or len(mapped) < entry.offset + entry.length:
+			# not mapped yet, or the segment has grown since
+			if mapped is not None: mapped.close()
+			with open(self._path(self.SEGMENT_FILE.format(entry.segment)), 'rb') as f:
+				mapped = self._maps[entry.segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		return zlib.decompress(mapped[entry.offset:entry.offset + entry.length])
+
+	def _read(self, n):
+		"""Returns (data, number of deltas since the last keyframe) for the nth snapshot.
+		If we're reading forwards (eg. the snapshot after the last one read), we start from the last one read
+		rather than going back to the keyframe."""
+		last_position, last_data, last_deltas = self._last_read
+		if last_position == n:
+			return last_data, last_deltas
+		deltas = []
+		position = n
+		while True:
+			if position == last_position:
+				data = last_data
+				deltas_before = last_deltas
+				break
+			payload = self._read_payload(self.index[position])
+			if not payload.startswith(self.DELTA_MARKER):
+				data = decode_json(payload)
+				deltas_before = 0
+				break
+			deltas.append(decode_json(payload[len(self.DELTA_MARKER):]))
+			position -= 1
+		for delta in reversed(deltas):
+			data = patch(data, delta)
+		self._last_read = n, data, deltas_before + len(deltas)
+		return self._last_read[1:]
+
+	def find(self, now):
+		"""Returns the position of the latest snapshot at or before given time, or None"""
+		n = bisect.bisect_right(self._nows, now)
+		return n - 1 if n else None
+
+	def find_tick(self, tick):
+		"""Returns the position of the latest snapshot of given tick, or None"""
+		for n in range(len(self.index) - 1, -1, -1):
+			if self.index[n].tick == tick:
+				return n
+		return None
+
+	def close(self):
+		for mapped in self._maps.values():
+			mapped.close()
+		self._maps = {}
@@ -10,5 +10,5 @@ setup(
 	author_email="mikelang3000@gmail.com",
 	url="http://github.com/ekimekim/neptunesfolly",
 	packages=['folly', 'folly.scripts'],
-	requires=["requests"],
+	requires=["requests", "numpy"],
 )
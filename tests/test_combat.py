@@ -0,0 +1,93 @@
+"""Checks that combat.combat() gives exactly the same results as the original round-by-round loop,
+on randomly generated fights.
+
+Run from the repository root with:
+	python -m unittest tests.test_combat
+"""
+
+import random
+import unittest
+
+from folly.combat import combat, simple
+
+
+def reference_combat(*forces):
+	"""The original implementation of combat.combat(), which simulates every attack one at a time.
+	Kept as the reference the optimised version must match. Force lists are modified in place, as with combat()."""
+	forces = [(ws + 1 if n == 0 else ws, force_list) for n, (ws, force_list) in enumerate(forces)]
+	i = 0
+	next = lambda x: (x+1) % len(forces)
+	while 1:
+		damage, force = forces[i]
+		while damage:
+			_, target_force = forces[next(i)]
+			dealt = min(damage, target_force[0])
+			target_force[0] -= dealt
+			damage -= dealt
+			if target_force[0] == 0:
+				target_force.pop(0)
+				if not target_force:
+					forces.pop(next(i))
+					if len(forces) == 1:
+						return
+		i = next(i)
+
+
+def random_fight(r, max_players=5, max_groups=5, max_ships=500, max_weapons=10):
+	"""Returns a list of (weapons, force list) for a random fight.
+	The defender's first group is sometimes 0, as for a star with no ships."""
+	forces = []
+	for n in range(r.randint(2, max_players)):
+		groups = [r.randint(1, max_ships) for _ in range(r.randint(1, max_groups))]
+		if n == 0 and r.random() < 0.1:
+			groups.insert(0, 0)
+		forces.append((r.randint(1, max_weapons), groups))
+	return forces
+
+
+class CombatEquivalenceTest(unittest.TestCase):
+
+	FIGHTS = 5000
+
+	def assertSameResult(self, forces):
+		expected = [(ws, list(force_list)) for ws, force_list in forces]
+		actual = [(ws, list(force_list)) for ws, force_list in forces]
+		reference_combat(*expected)
+		combat(*actual)
+		self.assertEqual(actual, expected, "combat{} gave {}, expected {}".format(tuple(forces), actual, expected))
+
+	def test_docstring_example(self):
+		self.assertSameResult([(1, [100, 75, 50]), (2, [150, 50]), (2, [200])])
+
+	def test_random_two_player(self):
+		r = random.Random(1)
+		for _ in range(self.FIGHTS):
+			self.assertSameResult(random_fight(r, max_players=2))
+
+	def test_random_multi_player(self):
+		r = random.Random(2)
+		for _ in range(self.FIGHTS):
+			self.assertSameResult(random_fight(r))
+
+	def test_random_small(self):
+		# small numbers of ships relative to weapons, so forces are often wiped out within a round
+		r = random.Random(3)
+		for _ in range(self.FIGHTS):
+			self.assertSameResult(random_fight(r, max_ships=20, max_weapons=30))
+
+	def test_random_large(self):
+		r = random.Random(4)
+		for _ in range(self.FIGHTS // 10):
+			self.assertSameResult(random_fight(r, max_groups=3, max_ships=5000, max_weapons=3))
+
+	def test_matches_simple(self):
+		r = random.Random(5)
+		for _ in range(self.FIGHTS):
+			def_WS, def_n, att_WS, att_n = r.randint(1, 10), r.randint(1, 1000), r.randint(1, 10), r.randint(1, 1000)
+			defender, attacker = [def_n], [att_n]
+			combat((def_WS, defender), (att_WS, attacker))
+			self.assertEqual(simple((def_WS, def_n), (att_WS, att_n)), (bool(defender), sum(defender or attacker)))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,75 @@
+"""Checks how request.Client handles full_universe_report responses, against a local HTTP server.
+
+Run from the repository root with:
+	python -m unittest tests.test_request
+"""
+
+import json
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+
+from folly.request import Client, RequestError
+
+
+REPORT = {'tick': 10, 'now': 0, 'started': True, 'paused': False, 'game_over': False, 'turn_based': False,
+          'tick_fragment': 0.5, 'tick_rate': 60}
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	"""Answers every POST with {"report": server.report}, and counts requests in server.requests."""
+	daemon_threads = True
+	report = REPORT
+	requests = 0
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+	def log_message(self, *args):
+		pass
+
+	def do_POST(self):
+		self.rfile.read(int(self.headers['content-length']))
+		self.server.requests += 1
+		body = json.dumps({'report': self.server.report})
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+class TestReport(unittest.TestCase):
+
+	def setUp(self):
+		self.server = Server(('127.0.0.1', 0), Handler)
+		thread = threading.Thread(target=self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+		self.client = Client('http://127.0.0.1:{}/'.format(self.server.server_address[1]))
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def report(self):
+		return self.client.order('full_universe_report', cookies={}, game_number=1)
+
+	def test_error_string(self):
+		self.server.report = 'game_not_found'
+		for _ in range(2):
+			with self.assertRaises(RequestError) as cm:
+				self.report()
+			self.assertEqual(cm.exception.args, ('game_not_found',))
+		# errors aren't cached
+		self.assertEqual(self.server.requests, 2)
+
+	def test_cached(self):
+		report = self.report()
+		self.assertEqual(report.tick, 10)
+		self.assertIs(self.report(), report)
+		self.assertEqual(self.server.requests, 1)
+
+
+if __name__ == '__main__':
+	unittest.main()